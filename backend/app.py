@@ -23,6 +23,17 @@ def create_app(config_class=Config):
     from routes.download import download_bp
     app.register_blueprint(download_bp, url_prefix='/api')
     
+    # Retomar downloads interrompidos por crash/timeout de um worker anterior
+    from services.youtube_service import youtube_service
+    if app.config['JOB_RESUME_ON_STARTUP']:
+        youtube_service.resume_interrupted_jobs()
+    
+    # Fila compartilhada entre máquinas (apenas com CLUSTER_REDIS_URL ou CLUSTER_DB_PATH configurado)
+    youtube_service.start_cluster_worker()
+    
+    # Limpeza periódica de downloads antigos (independe de requisições)
+    youtube_service.start_cleanup_timer()
+    
     # Error handlers
     @app.errorhandler(400)
     def bad_request(error):
@@ -0,0 +1,76 @@
+from quart import Quart, jsonify
+from quart_cors import cors
+from config import Config
+import logging
+
+
+def create_asgi_app(config_class=Config):
+    """
+    Factory para criar a aplicação assíncrona (ASGI)
+
+    Expõe as mesmas rotas /api de create_app(), mas as chamadas bloqueantes
+    rodam em um executor limitado e os arquivos são enviados de forma
+    assíncrona, então clientes lentos não prendem threads do servidor.
+    """
+
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+
+    # Configurar CORS
+    app = cors(app, allow_origin=app.config['CORS_ORIGINS'])
+
+    # Configurar logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # Registrar blueprints
+    from routes.download_async import download_async_bp, with_close_callbacks
+    app.register_blueprint(download_async_bp, url_prefix='/api')
+    # Libera arquivos enviados mesmo quando o cliente desconecta cedo
+    app.asgi_app = with_close_callbacks(app.asgi_app)
+
+    # Retomar downloads interrompidos por crash/timeout de um worker anterior
+    from services.youtube_service import youtube_service
+    if app.config['JOB_RESUME_ON_STARTUP']:
+        youtube_service.resume_interrupted_jobs()
+
+    # Fila compartilhada entre máquinas (apenas com CLUSTER_REDIS_URL ou CLUSTER_DB_PATH configurado)
+    youtube_service.start_cluster_worker()
+
+    # Limpeza periódica de downloads antigos (independe de requisições)
+    youtube_service.start_cleanup_timer()
+
+    # Error handlers
+    @app.errorhandler(400)
+    async def bad_request(error):
+        return jsonify({
+            'error': 'Bad Request',
+            'message': str(error)
+        }), 400
+
+    @app.errorhandler(404)
+    async def not_found(error):
+        return jsonify({
+            'error': 'Not Found',
+            'message': 'Endpoint não encontrado'
+        }), 404
+
+    @app.errorhandler(500)
+    async def internal_error(error):
+        return jsonify({
+            'error': 'Internal Server Error',
+            'message': 'Erro interno do servidor'
+        }), 500
+
+    @app.route('/')
+    async def index():
+        return jsonify({
+            'status': 'online',
+            'message': 'stream2downloader API',
+            'version': '1.0.0',
+            'mode': 'asgi'
+        })
+
+    return app
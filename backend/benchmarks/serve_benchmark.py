@@ -0,0 +1,212 @@
+"""
+Benchmark de entrega de arquivos para clientes lentos
+
+Sobe o backend em modo síncrono (gunicorn, create_app) e/ou assíncrono
+(uvicorn, create_asgi_app) e dispara N clientes simultâneos que baixam
+arquivos já prontos em /api/download lendo a uma taxa limitada. Os jobs
+são criados como concluídos no job store, então nenhum acesso ao YouTube
+é feito.
+
+Uso (a partir de backend/):
+    python benchmarks/serve_benchmark.py --mode both --clients 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_jobs(download_dir, clients, file_size):
+    """Cria um arquivo pronto e um job concluído por cliente"""
+    from services.job_store import JobStore, make_job_id
+
+    store = JobStore(str(download_dir / '.jobs.sqlite3'))
+    payload = os.urandom(1024 * 1024)
+    video_ids = []
+    for index in range(clients):
+        video_id = f"bench{index:06d}"
+        job_id = make_job_id(video_id, 'video', 'best')
+        file_path = download_dir / f"{job_id}.mp4"
+        with open(file_path, 'wb') as file:
+            for _ in range(file_size // len(payload)):
+                file.write(payload)
+        store.claim({
+            'job_id': job_id,
+            'url': f"https://youtu.be/{video_id}",
+            'video_id': video_id,
+            'quality': 'best',
+            'download_type': 'video',
+            'format': 'best',
+            'output_template': str(download_dir / f"{job_id}.%(ext)s"),
+        })
+        store.complete(job_id, str(file_path), video_id, file_path.stat().st_size)
+        video_ids.append(video_id)
+    return video_ids
+
+
+def start_server(mode, port, env, threads):
+    if mode == 'sync':
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', '1',
+            '--threads', str(threads),
+            '--timeout', '600',
+            'app:create_app()',
+        ]
+    else:
+        command = [
+            sys.executable, '-m', 'uvicorn',
+            '--factory', 'asgi:create_asgi_app',
+            '--host', '127.0.0.1',
+            '--port', str(port),
+            '--workers', '1',
+            '--log-level', 'warning',
+        ]
+    process = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Servidor ({mode}) não respondeu em 30s")
+
+
+async def slow_client(port, video_id, rate):
+    """Baixa um arquivo lendo no máximo `rate` bytes/s; retorna (ttfb, duração, bytes, status)"""
+    started = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({'url': f'https://youtu.be/{video_id}'}).encode()
+    writer.write(
+        b'POST /api/download HTTP/1.1\r\n'
+        b'Host: 127.0.0.1\r\n'
+        b'Content-Type: application/json\r\n'
+        b'Connection: close\r\n'
+        + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+        + body
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    ttfb = time.monotonic() - started
+    status = int(status_line.split()[1]) if status_line else 0
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+
+    received = 0
+    chunk_size = 64 * 1024
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        await asyncio.sleep(len(chunk) / rate)
+
+    writer.close()
+    return ttfb, time.monotonic() - started, received, status
+
+
+async def run_clients(port, video_ids, rate):
+    return await asyncio.gather(
+        *(slow_client(port, video_id, rate) for video_id in video_ids),
+        return_exceptions=True
+    )
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def benchmark(mode, args):
+    with tempfile.TemporaryDirectory(prefix=f'bench-{mode}-') as tmp:
+        download_dir = Path(tmp)
+        env = {
+            **os.environ,
+            'DOWNLOAD_FOLDER': str(download_dir),
+            'JOB_STORE_PATH': str(download_dir / '.jobs.sqlite3'),
+            'JOB_RESUME_ON_STARTUP': 'False',
+            'CLUSTER_REDIS_URL': '',
+            'CLUSTER_DB_PATH': '',
+            'DEBUG': 'False',
+        }
+        os.environ.update({key: env[key] for key in ('DOWNLOAD_FOLDER', 'JOB_STORE_PATH')})
+        video_ids = prepare_jobs(download_dir, args.clients, args.file_size_mb * 1024 * 1024)
+
+        port = free_port()
+        process = start_server(mode, port, env, args.threads)
+        try:
+            started = time.monotonic()
+            results = asyncio.run(run_clients(port, video_ids, args.client_rate_kb * 1024))
+            elapsed = time.monotonic() - started
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    ok = [r for r in results if not isinstance(r, Exception) and r[3] == 200]
+    ttfbs = [r[0] for r in ok]
+    total_bytes = sum(r[2] for r in ok)
+    return {
+        'mode': mode,
+        'clients': args.clients,
+        'ok': len(ok),
+        'failed': len(results) - len(ok),
+        'ttfb_p50': percentile(ttfbs, 0.5),
+        'ttfb_p95': percentile(ttfbs, 0.95),
+        'elapsed': elapsed,
+        'throughput_mb_s': total_bytes / elapsed / (1024 * 1024),
+        'mean_transfer': statistics.mean(r[1] for r in ok) if ok else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de entrega para clientes lentos')
+    parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--file-size-mb', type=int, default=8)
+    parser.add_argument('--client-rate-kb', type=int, default=512, help='KB/s lidos por cliente')
+    parser.add_argument('--threads', type=int, default=4, help='threads do gunicorn (modo sync)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    modes = ['sync', 'async'] if args.mode == 'both' else [args.mode]
+
+    print(f"{'modo':<6} {'ok':>5} {'falhas':>6} {'ttfb p50':>9} {'ttfb p95':>9} "
+          f"{'transf. média':>13} {'total':>8} {'MB/s':>7}")
+    for mode in modes:
+        result = benchmark(mode, args)
+        print(
+            f"{result['mode']:<6} {result['ok']:>5} {result['failed']:>6} "
+            f"{result['ttfb_p50']:>8.2f}s {result['ttfb_p95']:>8.2f}s "
+            f"{result['mean_transfer']:>12.2f}s {result['elapsed']:>7.2f}s "
+            f"{result['throughput_mb_s']:>7.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark do parser de URLs do YouTube
+
+Compara parse_youtube_url (regex única pré-compilada) com a implementação
+anterior (quatro regex não compiladas + parse_qs) sobre um lote de
+variantes de URL, e mostra quantas chaves de cache distintas cada uma gera.
+
+Uso (a partir de backend/):
+    python benchmarks/url_parser_benchmark.py --batch 10000
+"""
+import argparse
+import re
+import sys
+import timeit
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.validators import parse_youtube_url, ValidationError  # noqa: E402
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+URL_VARIANTS = [
+    f'https://www.youtube.com/watch?v={VIDEO_ID}',
+    f'https://youtube.com/watch?v={VIDEO_ID}&t=42s',
+    f'https://youtu.be/{VIDEO_ID}?t=1m30s',
+    f'https://m.youtube.com/watch?feature=share&v={VIDEO_ID}',
+    f'https://music.youtube.com/watch?v={VIDEO_ID}&list=RDAMVM{VIDEO_ID}',
+    f'https://www.youtube.com/shorts/{VIDEO_ID}?si=abcdef',
+    f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}?start=10',
+    f'https://www.youtube.com/embed/{VIDEO_ID}',
+    f'https://www.youtube.com/v/{VIDEO_ID}',
+    f'youtube.com/live/{VIDEO_ID}',
+    'https://vimeo.com/123456',
+]
+
+
+def legacy_validate_youtube_url(url):
+    """Implementação anterior de validate_youtube_url (referência)"""
+    url = url.strip()
+    youtube_patterns = [
+        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
+        r'(?:https?://)?(?:www\.)?youtu\.be/([a-zA-Z0-9_-]{11})',
+        r'(?:https?://)?(?:www\.)?youtube\.com/embed/([a-zA-Z0-9_-]{11})',
+        r'(?:https?://)?(?:www\.)?youtube\.com/v/([a-zA-Z0-9_-]{11})',
+    ]
+    for pattern in youtube_patterns:
+        match = re.match(pattern, url)
+        if match:
+            return match.group(1)
+    parsed_url = urlparse(url)
+    if 'youtube.com' in parsed_url.netloc or 'youtu.be' in parsed_url.netloc:
+        query_params = parse_qs(parsed_url.query)
+        if 'v' in query_params and len(query_params['v'][0]) == 11:
+            return query_params['v'][0]
+    raise ValidationError("URL do YouTube inválida")
+
+
+def run_batch(parser, urls):
+    keys = set()
+    rejected = 0
+    for url in urls:
+        try:
+            result = parser(url)
+        except ValidationError:
+            rejected += 1
+            continue
+        keys.add(result[0] if isinstance(result, tuple) else result)
+    return keys, rejected
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Micro-benchmark do parser de URLs')
+    arg_parser.add_argument('--batch', type=int, default=10000, help='URLs por lote')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    urls = (URL_VARIANTS * (args.batch // len(URL_VARIANTS) + 1))[:args.batch]
+
+    print(f"{'parser':<8} {'melhor lote':>12} {'URLs/s':>12} {'chaves':>7} {'rejeitadas':>11}")
+    for name, parser in (('legado', legacy_validate_youtube_url), ('novo', parse_youtube_url)):
+        best = min(timeit.repeat(lambda: run_batch(parser, urls), number=1, repeat=args.repeat))
+        keys, rejected = run_batch(parser, urls)
+        print(f"{name:<8} {best * 1000:>10.1f}ms {args.batch / best:>12,.0f} {len(keys):>7} {rejected:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Partes das rotas independentes do framework
+
+Compartilhadas pelo blueprint Flask (routes/download.py) e pelo Quart
+(routes/download_async.py): cada um só converte o resultado em resposta.
+"""
+from services.download_scheduler import SchedulerBusyError
+from services.cluster import cluster
+from services.process_pool import WorkerKilledError, KILL_MEMORY, KILL_TIMEOUT
+from utils.validators import ValidationError
+import logging
+
+logger = logging.getLogger(__name__)
+
+API_INFO = {
+    'endpoints': {
+        '/api/health': 'Health check',
+        '/api/health/live': 'Liveness (processo respondendo)',
+        '/api/health/ready': 'Readiness (capacidade para novas requisições)',
+        '/api/validate': 'Validar URL e obter informações do vídeo',
+        '/api/download': 'Fazer download do vídeo',
+        '/api/prefetch': 'Agendar download em segundo plano',
+        '/api/info': 'Informações da API'
+    },
+    'version': '1.0.0',
+    'documentation': 'https://github.com/seu-usuario/stream2downloader'
+}
+
+# Mensagens de log e de erro genérico por endpoint
+_ENDPOINT_MESSAGES = {
+    'validate': {
+        'busy': 'Validação recusada por falta de worker',
+        'invalid': 'Erro de validação',
+        'failed': 'Erro ao processar vídeo',
+    },
+    'download': {
+        'busy': 'Download recusado por falta de vaga',
+        'invalid': 'Erro de validação no download',
+        'failed': 'Erro ao fazer download do vídeo',
+    },
+    'prefetch': {
+        'busy': 'Prefetch recusado por falta de vaga',
+        'invalid': 'Erro de validação no prefetch',
+        'failed': 'Erro ao agendar download',
+    },
+}
+
+
+def error_response(error, endpoint):
+    """
+    Converte uma exceção de rota em payload JSON e status HTTP
+
+    Args:
+        error (Exception): Exceção levantada pelo serviço
+        endpoint (str): 'validate', 'download' ou 'prefetch'
+
+    Returns:
+        tuple: (payload, status)
+    """
+    messages = _ENDPOINT_MESSAGES[endpoint]
+
+    if isinstance(error, SchedulerBusyError):
+        logger.warning(f"{messages['busy']}: {str(error)}")
+        return {'success': False, 'error': str(error)}, 503
+
+    if isinstance(error, WorkerKilledError):
+        # Tarefa interrompida pelo pool isolado: falha do servidor, não do vídeo
+        if error.reason in (KILL_MEMORY, KILL_TIMEOUT):
+            logger.warning(f"Tarefa interrompida por limite de recurso: {str(error)}")
+            return {
+                'success': False,
+                'error': 'Servidor sem recursos para processar este vídeo agora. Tente novamente em instantes.'
+            }, 503
+        logger.error(f"Worker de processamento interrompido: {str(error)}")
+        return {'success': False, 'error': 'Erro interno ao processar vídeo'}, 500
+
+    if isinstance(error, ValidationError):
+        logger.warning(f"{messages['invalid']}: {str(error)}")
+        return {'success': False, 'error': str(error)}, 400
+
+    logger.error(f"Erro no endpoint {endpoint}: {str(error)}")
+    return {'success': False, 'error': messages['failed']}, 500
+
+
+def already_routed(request):
+    """Indica se a requisição já foi encaminhada por outra máquina (Flask ou Quart)"""
+    return bool(request.headers.get('Fly-Replay-Src') or request.args.get('routed'))
+
+
+def route_decision(job_id, routed, routing, path):
+    """
+    Decide se outra máquina, que já tem (ou está baixando) o arquivo, deve atender
+
+    Em Fly.io usa o header Fly-Replay; fora dele, redirect 307 para a URL
+    pública da máquina (preserva método e corpo do POST). Requisições já
+    encaminhadas não são encaminhadas de novo. Bloqueante: consulta o
+    estado do cluster.
+
+    Args:
+        job_id (str): ID do job
+        routed (bool): Requisição já encaminhada
+        routing (str): CLUSTER_ROUTING ('fly-replay' ou 'redirect')
+        path (str): Caminho da requisição
+
+    Returns:
+        dict: {'status', 'payload', 'headers'} (Fly-Replay) ou
+            {'status', 'location'} (redirect); None se esta máquina deve atender
+    """
+    node = cluster.route_target(job_id, routed)
+    if not node:
+        return None
+
+    if routing == 'fly-replay':
+        return {
+            'status': 409,
+            'payload': {'success': True, 'routed_to': node['node_id']},
+            'headers': {'Fly-Replay': f"instance={node['node_id']}"},
+        }
+    url = cluster.public_url(node)
+    if url:
+        return {'status': 307, 'location': f"{url}{path}?routed=1"}
+    return None
@@ -1,6 +1,8 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, redirect, current_app
 from services.youtube_service import youtube_service
-from utils.validators import ValidationError
+from services.download_scheduler import PRIORITY_INTERACTIVE
+from services.health_service import health_service
+from routes.common import API_INFO, error_response, already_routed, route_decision
 import logging
 import os
 
@@ -8,13 +10,51 @@ logger = logging.getLogger(__name__)
 
 download_bp = Blueprint('download', __name__)
 
+
+def _route_to_owner(job_id):
+    """
+    Encaminha a requisição para a máquina que já tem o arquivo (ver routes/common.py)
+    
+    Returns:
+        Response ou None se esta máquina deve atender
+    """
+    decision = route_decision(
+        job_id, already_routed(request), current_app.config['CLUSTER_ROUTING'], request.path
+    )
+    if decision is None:
+        return None
+    if 'location' in decision:
+        return redirect(decision['location'], code=decision['status'])
+    return jsonify(decision['payload']), decision['status'], decision['headers']
+
+
 @download_bp.route('/health', methods=['GET'])
+@download_bp.route('/health/live', methods=['GET'])
 def health_check():
-    """Endpoint de health check"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'stream2downloader'
-    }), 200
+    """Endpoint de liveness: o processo está respondendo"""
+    return jsonify(health_service.liveness()), 200
+
+
+@download_bp.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """
+    Endpoint de readiness: a máquina tem capacidade para novas requisições
+    
+    Retorna 503 quando está saturada (downloads em excesso, fila cheia,
+    pouco disco ou muitas falhas do YouTube), para que Fly/nginx
+    direcionem o tráfego a outra máquina.
+    """
+    try:
+        ready, payload = health_service.readiness()
+    except Exception as e:
+        logger.error(f"Erro no readiness check: {str(e)}")
+        return jsonify({
+            'status': 'unavailable',
+            'service': 'stream2downloader',
+            'reasons': ['readiness_check_failed']
+        }), 503
+    
+    return jsonify(payload), 200 if ready else 503
 
 
 @download_bp.route('/validate', methods=['POST'])
@@ -53,9 +93,6 @@ def validate_video():
         
         url = data['url']
         
-        # Limpar arquivos antigos antes de processar
-        youtube_service.cleanup_old_files()
-        
         # Extrair informações do vídeo
         video_info = youtube_service.extract_video_info(url)
         
@@ -64,19 +101,9 @@ def validate_video():
             'data': video_info
         }), 200
         
-    except ValidationError as e:
-        logger.warning(f"Erro de validação: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-        
     except Exception as e:
-        logger.error(f"Erro no endpoint validate: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Erro ao processar vídeo'
-        }), 500
+        payload, status = error_response(e, 'validate')
+        return jsonify(payload), status
 
 
 @download_bp.route('/download', methods=['POST'])
@@ -88,7 +115,8 @@ def download_video():
         {
             "url": "https://youtube.com/watch?v=...",
             "quality": "720p",  // opcional, default: "best"
-            "download_type": "video"  // opcional: "video" ou "audio", default: "video"
+            "download_type": "video",  // opcional: "video" ou "audio", default: "video"
+            "priority": "interactive"  // opcional: "interactive", "prefetch" ou "batch"
         }
     
     Response:
@@ -106,11 +134,17 @@ def download_video():
         url = data['url']
         quality = data.get('quality', 'best')
         download_type = data.get('download_type', 'video')
+        priority = data.get('priority', PRIORITY_INTERACTIVE)
         
         logger.info(f"Requisição de download: {url} ({download_type}) em qualidade {quality}")
         
+        # Cache-affinity: outra máquina já tem este arquivo
+        routed = _route_to_owner(youtube_service.job_id_for(url, quality, download_type))
+        if routed is not None:
+            return routed
+        
         # Fazer download do vídeo/áudio
-        download_info = youtube_service.download_video(url, quality, download_type)
+        download_info = youtube_service.download_video(url, quality, download_type, priority)
         
         file_path = download_info['file_path']
         
@@ -133,40 +167,59 @@ def download_video():
         # Agendar limpeza do arquivo após envio
         @response.call_on_close
         def cleanup():
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Arquivo removido após envio: {file_path}")
-            except Exception as e:
-                logger.error(f"Erro ao remover arquivo: {str(e)}")
+            youtube_service.release_download(download_info)
         
         return response
         
-    except ValidationError as e:
-        logger.warning(f"Erro de validação no download: {str(e)}")
+    except Exception as e:
+        payload, status = error_response(e, 'download')
+        return jsonify(payload), status
+
+
+@download_bp.route('/prefetch', methods=['POST'])
+def prefetch_video():
+    """
+    Agenda o download em segundo plano para que o arquivo já esteja pronto
+    
+    Payload:
+        {
+            "url": "https://youtube.com/watch?v=...",
+            "quality": "720p",  // opcional, default: "best"
+            "download_type": "video"  // opcional: "video" ou "audio"
+        }
+    
+    Response:
+        {
+            "success": true,
+            "data": {"job_id": "...", "status": "queued"}
+        }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or 'url' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'URL não fornecida'
+            }), 400
+        
+        job = youtube_service.prefetch(
+            data['url'],
+            data.get('quality', 'best'),
+            data.get('download_type', 'video')
+        )
+        
         return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
+            'success': True,
+            'data': job
+        }), 202
         
     except Exception as e:
-        logger.error(f"Erro no endpoint download: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Erro ao fazer download do vídeo'
-        }), 500
+        payload, status = error_response(e, 'prefetch')
+        return jsonify(payload), status
 
 
 @download_bp.route('/info', methods=['GET'])
 def api_info():
     """Retorna informações sobre a API"""
-    return jsonify({
-        'endpoints': {
-            '/api/health': 'Health check',
-            '/api/validate': 'Validar URL e obter informações do vídeo',
-            '/api/download': 'Fazer download do vídeo',
-            '/api/info': 'Informações da API'
-        },
-        'version': '1.0.0',
-        'documentation': 'https://github.com/seu-usuario/stream2downloader'
-    }), 200
+    return jsonify(API_INFO), 200
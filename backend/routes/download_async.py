@@ -0,0 +1,291 @@
+from quart import Blueprint, Response, request, jsonify, redirect, current_app
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from services.youtube_service import youtube_service
+from services.download_scheduler import PRIORITY_INTERACTIVE
+from services.health_service import health_service
+from routes.common import API_INFO, error_response, already_routed, route_decision
+from urllib.parse import quote
+from werkzeug.http import dump_options_header
+import asyncio
+import logging
+import os
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+download_async_bp = Blueprint('download_async', __name__)
+
+# Executor limitado para as chamadas bloqueantes do yt-dlp e da fila (validação, prefetch)
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=Config.ASYNC_BLOCKING_WORKERS,
+    thread_name_prefix='blocking'
+)
+
+# Executor para E/S local rápida (blocos de arquivo, job store, cluster,
+# readiness): não espera atrás de validações lentas, então health checks e
+# transferências em andamento continuam respondendo
+_io_executor = ThreadPoolExecutor(
+    max_workers=Config.ASYNC_IO_WORKERS,
+    thread_name_prefix='io'
+)
+
+# Executor separado para downloads: as threads passam minutos esperando
+# (fila do agendador, job de outro worker, worker isolado) e não podem
+# ocupar as threads da validação
+_download_executor = ThreadPoolExecutor(
+    max_workers=Config.ASYNC_DOWNLOAD_WORKERS,
+    thread_name_prefix='download'
+)
+
+FILE_CHUNK_SIZE = 256 * 1024  # 256KB
+
+# Chave no scope ASGI com as funções a executar quando a requisição termina
+ON_CLOSE_SCOPE_KEY = 'stream2downloader.on_close'
+
+
+async def run_blocking(func, *args, executor=_blocking_executor):
+    """Executa uma função bloqueante no executor limitado sem travar o event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, func, *args)
+
+
+def call_on_close(func):
+    """
+    Equivalente ao response.call_on_close do Flask
+
+    A função roda quando a requisição termina, mesmo que o cliente
+    desconecte antes de o corpo da resposta começar a ser enviado (caso em
+    que o Quart nunca inicia o gerador do corpo). Depende de
+    with_close_callbacks envolvendo o app ASGI.
+    """
+    request.scope.setdefault(ON_CLOSE_SCOPE_KEY, []).append(func)
+
+
+def with_close_callbacks(asgi_app):
+    """Envolve o app ASGI para executar as funções registradas por call_on_close"""
+    async def app(scope, receive, send):
+        try:
+            await asgi_app(scope, receive, send)
+        finally:
+            for func in scope.get(ON_CLOSE_SCOPE_KEY, ()):
+                # Submete sem aguardar: roda mesmo se esta task estiver sendo cancelada
+                _io_executor.submit(func)
+    return app
+
+
+def _content_disposition(download_name):
+    """
+    Monta o header Content-Disposition (RFC 6266) aceitando nomes não-ASCII
+
+    Mesma lógica do send_file do Flask/Werkzeug: aspas e barras invertidas
+    do título são escapadas por dump_options_header.
+    """
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        names = {'filename': simple, 'filename*': f"UTF-8''{quoted}"}
+    else:
+        names = {'filename': download_name}
+    return dump_options_header('attachment', names)
+
+
+def _stream_file_response(download_info):
+    """
+    Envia o arquivo em blocos de forma assíncrona
+
+    A leitura de cada bloco roda no executor de E/S, e o envio respeita o
+    ritmo do cliente sem ocupar uma thread por transferência. O arquivo é
+    liberado ao final (inclusive se o cliente desconectar).
+    """
+    file_path = download_info['file_path']
+    file_size = os.path.getsize(file_path)
+    released = threading.Lock()
+
+    def release():
+        # Chamado pelo fim do corpo e por call_on_close; só a primeira chamada libera
+        if released.acquire(blocking=False):
+            youtube_service.release_download(download_info)
+
+    async def body():
+        try:
+            with open(file_path, 'rb') as file:
+                while True:
+                    chunk = await run_blocking(file.read, FILE_CHUNK_SIZE, executor=_io_executor)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            await run_blocking(release, executor=_io_executor)
+
+    mimetype = 'audio/mpeg' if download_info.get('download_type') == 'audio' else 'video/mp4'
+    response = Response(
+        body(),
+        mimetype=mimetype,
+        headers={
+            'Content-Length': str(file_size),
+            'Content-Disposition': _content_disposition(
+                f"{download_info['title']}{download_info['ext']}"
+            ),
+        }
+    )
+    # Transferências para clientes lentos podem passar do RESPONSE_TIMEOUT padrão
+    response.timeout = None
+    call_on_close(release)
+    return response
+
+
+async def _route_to_owner(job_id):
+    """
+    Encaminha a requisição para a máquina que já tem o arquivo (ver routes/common.py)
+
+    Returns:
+        Response ou None se esta máquina deve atender
+    """
+    decision = await run_blocking(
+        route_decision, job_id, already_routed(request), current_app.config['CLUSTER_ROUTING'], request.path,
+        executor=_io_executor
+    )
+    if decision is None:
+        return None
+    if 'location' in decision:
+        return redirect(decision['location'], code=decision['status'])
+    return jsonify(decision['payload']), decision['status'], decision['headers']
+
+
+@download_async_bp.route('/health', methods=['GET'])
+@download_async_bp.route('/health/live', methods=['GET'])
+async def health_check():
+    """Endpoint de liveness: o processo está respondendo"""
+    return jsonify(health_service.liveness()), 200
+
+
+@download_async_bp.route('/health/ready', methods=['GET'])
+async def readiness_check():
+    """Endpoint de readiness: a máquina tem capacidade para novas requisições"""
+    try:
+        ready, payload = await run_blocking(health_service.readiness, executor=_io_executor)
+    except Exception as e:
+        logger.error(f"Erro no readiness check: {str(e)}")
+        return jsonify({
+            'status': 'unavailable',
+            'service': 'stream2downloader',
+            'reasons': ['readiness_check_failed']
+        }), 503
+
+    return jsonify(payload), 200 if ready else 503
+
+
+@download_async_bp.route('/validate', methods=['POST'])
+async def validate_video():
+    """Valida URL do YouTube e retorna informações do vídeo (ver routes/download.py)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'url' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'URL não fornecida'
+            }), 400
+
+        url = data['url']
+
+        # Extrair informações do vídeo
+        video_info = await run_blocking(youtube_service.extract_video_info, url)
+
+        return jsonify({
+            'success': True,
+            'data': video_info
+        }), 200
+
+    except Exception as e:
+        payload, status = error_response(e, 'validate')
+        return jsonify(payload), status
+
+
+@download_async_bp.route('/download', methods=['POST'])
+async def download_video():
+    """Faz download do vídeo ou áudio e envia o arquivo (ver routes/download.py)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'url' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'URL não fornecida'
+            }), 400
+
+        url = data['url']
+        quality = data.get('quality', 'best')
+        download_type = data.get('download_type', 'video')
+        priority = data.get('priority', PRIORITY_INTERACTIVE)
+
+        logger.info(f"Requisição de download: {url} ({download_type}) em qualidade {quality}")
+
+        # Cache-affinity: outra máquina já tem este arquivo
+        routed = await _route_to_owner(youtube_service.job_id_for(url, quality, download_type))
+        if routed is not None:
+            return routed
+
+        # Fazer download do vídeo/áudio; se o cliente desconectar, o worker
+        # isolado é encerrado em vez de terminar um download que ninguém vai ler
+        cancel_event = threading.Event()
+        try:
+            download_info = await run_blocking(
+                youtube_service.download_video, url, quality, download_type, priority, cancel_event,
+                executor=_download_executor
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+        # Verificar se o arquivo existe
+        if not os.path.exists(download_info['file_path']):
+            return jsonify({
+                'success': False,
+                'error': 'Arquivo não encontrado após download'
+            }), 500
+
+        return _stream_file_response(download_info)
+
+    except Exception as e:
+        payload, status = error_response(e, 'download')
+        return jsonify(payload), status
+
+
+@download_async_bp.route('/prefetch', methods=['POST'])
+async def prefetch_video():
+    """Agenda o download em segundo plano (ver routes/download.py)"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'url' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'URL não fornecida'
+            }), 400
+
+        job = await run_blocking(
+            youtube_service.prefetch,
+            data['url'],
+            data.get('quality', 'best'),
+            data.get('download_type', 'video')
+        )
+
+        return jsonify({
+            'success': True,
+            'data': job
+        }), 202
+
+    except Exception as e:
+        payload, status = error_response(e, 'prefetch')
+        return jsonify(payload), status
+
+
+@download_async_bp.route('/info', methods=['GET'])
+async def api_info():
+    """Retorna informações sobre a API"""
+    return jsonify(API_INFO), 200
@@ -0,0 +1,613 @@
+import ipaddress
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Estados de um job na fila compartilhada
+QUEUE_QUEUED = 'queued'
+QUEUE_CLAIMED = 'claimed'
+QUEUE_DONE = 'done'
+QUEUE_FAILED = 'failed'
+
+# Entradas do cache de informações expiram no Redis após este tempo
+INFO_CACHE_MAX_AGE = 24 * 3600
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS nodes (
+        node_id TEXT PRIMARY KEY,
+        url TEXT,
+        active_downloads INTEGER NOT NULL DEFAULT 0,
+        last_seen REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS artifacts (
+        job_id TEXT NOT NULL,
+        node_id TEXT NOT NULL,
+        file_size INTEGER,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (job_id, node_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS queue (
+        job_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        priority INTEGER NOT NULL,
+        origin_node TEXT NOT NULL,
+        node_id TEXT,
+        status TEXT NOT NULL,
+        enqueued_at REAL NOT NULL,
+        claimed_at REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS info_cache (
+        video_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        timestamp REAL NOT NULL
+    )
+    """,
+]
+
+
+class _SQLiteStore:
+    """
+    Estado do cluster em um arquivo SQLite
+
+    Serve para vários processos no mesmo host. Usa o journal padrão (não
+    WAL); nenhum dos dois modos é seguro em volumes de rede ou réplicas
+    somente leitura, por isso entre máquinas use o Redis.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn = sqlite3.connect(self.db_path, timeout=10)
+                    try:
+                        for statement in _SCHEMA:
+                            conn.execute(statement)
+                        conn.commit()
+                    finally:
+                        conn.close()
+                    self._initialized = True
+
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def heartbeat(self, node_id, url, active_downloads):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO nodes (node_id, url, active_downloads, last_seen) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(node_id) DO UPDATE SET url = excluded.url, '
+                'active_downloads = excluded.active_downloads, last_seen = excluded.last_seen',
+                (node_id, url, active_downloads, time.time())
+            )
+
+    def alive_nodes(self, cutoff):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT * FROM nodes WHERE last_seen >= ? ORDER BY active_downloads', (cutoff,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def register_artifact(self, job_id, node_id, file_size):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO artifacts (job_id, node_id, file_size, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (job_id, node_id, file_size, time.time())
+            )
+
+    def unregister_artifact(self, job_id, node_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM artifacts WHERE job_id = ? AND node_id = ?', (job_id, node_id))
+
+    def locate(self, job_id, node_id, cutoff):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT n.node_id, n.url FROM artifacts a JOIN nodes n ON n.node_id = a.node_id '
+                'WHERE a.job_id = ? AND n.last_seen >= ? '
+                'ORDER BY (n.node_id = ?) DESC, n.active_downloads LIMIT 1',
+                (job_id, cutoff, node_id)
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    'SELECT n.node_id, n.url FROM queue q JOIN nodes n ON n.node_id = q.node_id '
+                    'WHERE q.job_id = ? AND q.status = ? AND n.last_seen >= ?',
+                    (job_id, QUEUE_CLAIMED, cutoff)
+                ).fetchone()
+        return dict(row) if row else None
+
+    def enqueue(self, job_id, payload, priority, node_id):
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT status FROM queue WHERE job_id = ?', (job_id,)).fetchone()
+                if row and row['status'] in (QUEUE_QUEUED, QUEUE_CLAIMED):
+                    conn.execute('COMMIT')
+                    return row['status']
+                conn.execute(
+                    'INSERT OR REPLACE INTO queue (job_id, payload, priority, origin_node, node_id, '
+                    'status, enqueued_at, claimed_at) VALUES (?, ?, ?, ?, NULL, ?, ?, NULL)',
+                    (job_id, json.dumps(payload), priority, node_id, QUEUE_QUEUED, time.time())
+                )
+                conn.execute('COMMIT')
+                return QUEUE_QUEUED
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def claim_next(self, node_id, cutoff, steal_before):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'UPDATE queue SET status = ?, node_id = NULL, claimed_at = NULL '
+                    'WHERE status = ? AND node_id NOT IN (SELECT node_id FROM nodes WHERE last_seen >= ?)',
+                    (QUEUE_QUEUED, QUEUE_CLAIMED, cutoff)
+                )
+                row = conn.execute(
+                    'SELECT job_id, payload FROM queue WHERE status = ? '
+                    'AND (origin_node = ? OR enqueued_at <= ?) '
+                    'ORDER BY priority, enqueued_at LIMIT 1',
+                    (QUEUE_QUEUED, node_id, steal_before)
+                ).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    'UPDATE queue SET status = ?, node_id = ?, claimed_at = ? WHERE job_id = ?',
+                    (QUEUE_CLAIMED, node_id, now, row['job_id'])
+                )
+                conn.execute('COMMIT')
+                return row['job_id'], json.loads(row['payload'])
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def finish(self, job_id, node_id, success):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE queue SET status = ? WHERE job_id = ? AND node_id = ?',
+                (QUEUE_DONE if success else QUEUE_FAILED, job_id, node_id)
+            )
+
+    def queue_depth(self):
+        with self._connect() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM queue WHERE status = ?', (QUEUE_QUEUED,)).fetchone()
+        return row[0]
+
+    def get_info(self, video_id, min_timestamp):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT data FROM info_cache WHERE video_id = ? AND timestamp >= ?',
+                (video_id, min_timestamp)
+            ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_info(self, video_id, data):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO info_cache (video_id, data, timestamp) VALUES (?, ?, ?)',
+                (video_id, json.dumps(data), time.time())
+            )
+
+
+# Scripts Lua: enfileirar e assumir jobs precisam ser atômicos entre máquinas.
+# Chaves: {prefix}nodes (zset node -> last_seen), {prefix}queue (zset de jobs
+# enfileirados, score = prioridade/ordem), {prefix}claimed (set de jobs em
+# execução) e {prefix}job:<id> (hash com o estado do job).
+_ENQUEUE_SCRIPT = """
+local prefix = ARGV[1]
+local job_key = prefix .. 'job:' .. ARGV[2]
+local status = redis.call('HGET', job_key, 'status')
+if status == 'queued' or status == 'claimed' then
+    return status
+end
+redis.call('HSET', job_key, 'payload', ARGV[3], 'origin_node', ARGV[4], 'status', 'queued',
+    'enqueued_at', ARGV[5], 'score', ARGV[6], 'node_id', '')
+redis.call('PERSIST', job_key)
+redis.call('ZADD', prefix .. 'queue', ARGV[6], ARGV[2])
+return 'queued'
+"""
+
+_CLAIM_SCRIPT = """
+local prefix = ARGV[1]
+local node_id = ARGV[2]
+local cutoff = tonumber(ARGV[3])
+local steal_before = tonumber(ARGV[4])
+local now = ARGV[5]
+local queue_key = prefix .. 'queue'
+
+-- Jobs de máquinas mortas voltam para a fila
+for _, job_id in ipairs(redis.call('SMEMBERS', prefix .. 'claimed')) do
+    local job_key = prefix .. 'job:' .. job_id
+    local owner = redis.call('HGET', job_key, 'node_id')
+    local seen = owner and redis.call('ZSCORE', prefix .. 'nodes', owner)
+    if not seen or tonumber(seen) < cutoff then
+        redis.call('SREM', prefix .. 'claimed', job_id)
+        redis.call('HSET', job_key, 'status', 'queued', 'node_id', '')
+        redis.call('ZADD', queue_key, redis.call('HGET', job_key, 'score'), job_id)
+    end
+end
+
+for _, job_id in ipairs(redis.call('ZRANGE', queue_key, 0, -1)) do
+    local job_key = prefix .. 'job:' .. job_id
+    local fields = redis.call('HMGET', job_key, 'origin_node', 'enqueued_at', 'payload')
+    if fields[1] == node_id or tonumber(fields[2]) <= steal_before then
+        redis.call('ZREM', queue_key, job_id)
+        redis.call('SADD', prefix .. 'claimed', job_id)
+        redis.call('HSET', job_key, 'status', 'claimed', 'node_id', node_id, 'claimed_at', now)
+        return {job_id, fields[3]}
+    end
+end
+return nil
+"""
+
+
+class _RedisStore:
+    """
+    Estado do cluster em um Redis (ou compatível: Valkey, Upstash, KeyDB)
+
+    Indicado para Fly.io, onde as máquinas não compartilham sistema de
+    arquivos. Operações de fila usam scripts Lua para serem atômicas.
+    """
+
+    def __init__(self, url, prefix):
+        import redis  # dependência só necessária com CLUSTER_REDIS_URL
+
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=10)
+        self._enqueue = self._redis.register_script(_ENQUEUE_SCRIPT)
+        self._claim = self._redis.register_script(_CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(parts)
+
+    def heartbeat(self, node_id, url, active_downloads):
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key('node', node_id), mapping={'url': url or '', 'active_downloads': active_downloads})
+        pipe.zadd(self._key('nodes'), {node_id: now})
+        pipe.execute()
+
+    def alive_nodes(self, cutoff):
+        nodes = []
+        for node_id, last_seen in self._redis.zrangebyscore(self._key('nodes'), cutoff, '+inf', withscores=True):
+            data = self._redis.hgetall(self._key('node', node_id))
+            nodes.append({
+                'node_id': node_id,
+                'url': data.get('url') or None,
+                'active_downloads': int(data.get('active_downloads') or 0),
+                'last_seen': last_seen,
+            })
+        return sorted(nodes, key=lambda node: node['active_downloads'])
+
+    def register_artifact(self, job_id, node_id, file_size):
+        self._redis.hset(
+            self._key('artifact', job_id), node_id,
+            json.dumps({'file_size': file_size, 'created_at': time.time()})
+        )
+
+    def unregister_artifact(self, job_id, node_id):
+        self._redis.hdel(self._key('artifact', job_id), node_id)
+
+    def locate(self, job_id, node_id, cutoff):
+        alive = {node['node_id']: node for node in self.alive_nodes(cutoff)}
+        holders = [alive[holder] for holder in self._redis.hkeys(self._key('artifact', job_id)) if holder in alive]
+        if holders:
+            holders.sort(key=lambda node: (node['node_id'] != node_id, node['active_downloads']))
+            return {'node_id': holders[0]['node_id'], 'url': holders[0]['url']}
+        status, owner = self._redis.hmget(self._key('job', job_id), 'status', 'node_id')
+        if status == QUEUE_CLAIMED and owner in alive:
+            return {'node_id': owner, 'url': alive[owner]['url']}
+        return None
+
+    def enqueue(self, job_id, payload, priority, node_id):
+        now = time.time()
+        # Ordem da fila: prioridade primeiro, depois chegada
+        score = priority * 1e10 + now
+        return self._enqueue(args=[self.prefix, job_id, json.dumps(payload), node_id, now, score])
+
+    def claim_next(self, node_id, cutoff, steal_before):
+        result = self._claim(args=[self.prefix, node_id, cutoff, steal_before, time.time()])
+        if not result:
+            return None
+        return result[0], json.loads(result[1])
+
+    def finish(self, job_id, node_id, success):
+        job_key = self._key('job', job_id)
+        if self._redis.hget(job_key, 'node_id') != node_id:
+            return
+        pipe = self._redis.pipeline()
+        pipe.srem(self._key('claimed'), job_id)
+        pipe.hset(job_key, 'status', QUEUE_DONE if success else QUEUE_FAILED)
+        pipe.expire(job_key, INFO_CACHE_MAX_AGE)
+        pipe.execute()
+
+    def queue_depth(self):
+        return self._redis.zcard(self._key('queue'))
+
+    def get_info(self, video_id, min_timestamp):
+        raw = self._redis.get(self._key('info', video_id))
+        if not raw:
+            return None
+        entry = json.loads(raw)
+        return entry['data'] if entry['timestamp'] >= min_timestamp else None
+
+    def put_info(self, video_id, data):
+        self._redis.set(
+            self._key('info', video_id),
+            json.dumps({'data': data, 'timestamp': time.time()}),
+            ex=INFO_CACHE_MAX_AGE
+        )
+
+
+class ClusterCoordinator:
+    """
+    Camada opcional de coordenação entre máquinas
+
+    Mantém uma fila de jobs, um índice de arquivos prontos por máquina
+    (artefatos) e um cache compartilhado de informações de vídeo em um
+    Redis (CLUSTER_REDIS_URL, para máquinas Fly.io) ou em um SQLite
+    (CLUSTER_DB_PATH, para vários processos no mesmo host). Sem nenhum
+    dos dois a camada fica desabilitada e todos os métodos são no-op.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.redis_url = self.config.CLUSTER_REDIS_URL
+        self.db_path = self.config.CLUSTER_DB_PATH
+        self.enabled = bool(self.redis_url or self.db_path)
+        self.node_id = self.config.CLUSTER_NODE_ID or socket.gethostname()
+        self.node_url = self.config.CLUSTER_NODE_URL
+        self.heartbeat_interval = self.config.CLUSTER_HEARTBEAT_INTERVAL
+        self.steal_after = self.config.CLUSTER_STEAL_AFTER
+        self._store_lock = threading.Lock()
+        self._store_instance = None
+        self._worker = None
+        self._heartbeat = None
+
+    @property
+    def _store(self):
+        if self._store_instance is None:
+            with self._store_lock:
+                if self._store_instance is None:
+                    if self.redis_url:
+                        self._store_instance = _RedisStore(self.redis_url, self.config.CLUSTER_REDIS_PREFIX)
+                    else:
+                        self._store_instance = _SQLiteStore(self.db_path)
+        return self._store_instance
+
+    def _alive_cutoff(self):
+        return time.time() - self.heartbeat_interval * 3
+
+    # Máquinas
+
+    def heartbeat(self, active_downloads=0):
+        """
+        Registra que esta máquina está viva e sua carga atual
+
+        Args:
+            active_downloads (int): Downloads em andamento na máquina inteira
+                (job store local, compartilhado pelos processos do gunicorn)
+        """
+        if not self.enabled:
+            return
+        self._store.heartbeat(self.node_id, self.node_url, active_downloads)
+
+    def alive_nodes(self):
+        if not self.enabled:
+            return []
+        return self._store.alive_nodes(self._alive_cutoff())
+
+    # Artefatos (arquivos prontos por máquina)
+
+    def register_artifact(self, job_id, file_size):
+        if not self.enabled:
+            return
+        self._store.register_artifact(job_id, self.node_id, file_size)
+
+    def unregister_artifact(self, job_id):
+        if not self.enabled:
+            return
+        self._store.unregister_artifact(job_id, self.node_id)
+
+    def locate(self, job_id):
+        """
+        Encontra a máquina viva mais adequada para atender um job
+
+        Prefere a máquina que já tem o arquivo pronto; senão, a que está
+        executando o job na fila compartilhada.
+
+        Args:
+            job_id (str): ID do job
+
+        Returns:
+            dict: Máquina (node_id, url) ou None se nenhuma outra tiver o job
+        """
+        if not self.enabled:
+            return None
+        return self._store.locate(job_id, self.node_id, self._alive_cutoff())
+
+    def public_url(self, node):
+        """
+        URL para redirecionar o navegador do usuário até outra máquina
+
+        No modo redirect o 307 é seguido pelo cliente, então endereços de
+        rede interna (privados, link-local) não servem. Loopback é aceito
+        para testes locais com várias máquinas no mesmo host.
+
+        Returns:
+            str: URL da máquina ou None se ela não tiver URL pública
+        """
+        url = node.get('url')
+        if not url:
+            return None
+        try:
+            address = ipaddress.ip_address(urlparse(url).hostname or '')
+        except ValueError:
+            return url
+        if not address.is_loopback and (address.is_private or address.is_link_local):
+            logger.warning(
+                f"Máquina {node['node_id']} sem URL pública ({url}); atendendo localmente"
+            )
+            return None
+        return url
+
+    def route_target(self, job_id, already_routed=False):
+        """
+        Decide se a requisição de um job deve ser atendida por outra máquina
+
+        Args:
+            job_id (str): ID do job
+            already_routed (bool): Requisição já foi encaminhada (evita loops)
+
+        Returns:
+            dict: Máquina de destino ou None se esta máquina deve atender
+        """
+        if not self.enabled or already_routed:
+            return None
+        try:
+            node = self.locate(job_id)
+        except Exception as e:
+            logger.warning(f"Erro ao consultar cluster: {str(e)}")
+            return None
+        if not node or node['node_id'] == self.node_id:
+            return None
+        logger.info(f"Encaminhando job {job_id} para a máquina {node['node_id']}")
+        return node
+
+    # Fila compartilhada
+
+    def enqueue(self, job_id, payload, priority=1):
+        """
+        Coloca um job na fila compartilhada (sem duplicar jobs pendentes)
+
+        Returns:
+            str: Estado do job após a chamada ('queued' ou 'claimed')
+        """
+        return self._store.enqueue(job_id, payload, priority, self.node_id)
+
+    def claim_next(self):
+        """
+        Assume o próximo job da fila
+
+        Jobs enfileirados por esta máquina são assumidos imediatamente; os
+        de outras máquinas só depois de CLUSTER_STEAL_AFTER segundos (roubo
+        de trabalho por máquinas ociosas). Jobs de máquinas mortas voltam
+        para a fila.
+
+        Returns:
+            tuple: (job_id, payload) ou None se não houver trabalho
+        """
+        return self._store.claim_next(
+            self.node_id, self._alive_cutoff(), time.time() - self.steal_after
+        )
+
+    def finish(self, job_id, success=True):
+        self._store.finish(job_id, self.node_id, success)
+
+    def queue_depth(self):
+        if not self.enabled:
+            return 0
+        return self._store.queue_depth()
+
+    # Cache compartilhado de informações de vídeo
+
+    def get_info(self, video_id, ttl):
+        if not self.enabled:
+            return None
+        return self._store.get_info(video_id, time.time() - ttl)
+
+    def put_info(self, video_id, data):
+        if not self.enabled:
+            return
+        self._store.put_info(video_id, data)
+
+    # Worker de fila
+
+    def start_worker(self, run_job, is_idle, current_load):
+        """
+        Inicia as threads de heartbeat e de consumo da fila
+
+        O heartbeat roda em thread própria para que um job longo não faça
+        esta máquina parecer morta (o que devolveria o job à fila e tiraria
+        seus arquivos do roteamento).
+
+        Args:
+            run_job (callable): Executa o payload de um job; levanta exceção em falha
+            is_idle (callable): Retorna se a máquina está ociosa (todos os processos)
+            current_load (callable): Downloads em andamento na máquina (todos os processos)
+        """
+        if not self.enabled or self._worker is not None:
+            return None
+
+        def heartbeat_loop():
+            while True:
+                try:
+                    self.heartbeat(current_load())
+                except Exception as e:
+                    logger.error(f"Erro no heartbeat do cluster: {str(e)}")
+                time.sleep(self.heartbeat_interval)
+
+        def worker():
+            while True:
+                try:
+                    claimed = self.claim_next() if is_idle() else None
+                except Exception as e:
+                    logger.error(f"Erro na coordenação do cluster: {str(e)}")
+                    claimed = None
+
+                if claimed is None:
+                    time.sleep(self.heartbeat_interval)
+                    continue
+
+                job_id, payload = claimed
+                logger.info(f"Job {job_id} assumido da fila compartilhada")
+                try:
+                    run_job(payload)
+                    self.finish(job_id, success=True)
+                except Exception as e:
+                    logger.error(f"Erro ao executar job {job_id} da fila: {str(e)}")
+                    try:
+                        self.finish(job_id, success=False)
+                    except Exception:
+                        pass
+
+        # Primeiro heartbeat antes de assumir jobs
+        try:
+            self.heartbeat(current_load())
+        except Exception as e:
+            logger.error(f"Erro no heartbeat do cluster: {str(e)}")
+        self._heartbeat = threading.Thread(target=heartbeat_loop, name='cluster-heartbeat', daemon=True)
+        self._heartbeat.start()
+        self._worker = threading.Thread(target=worker, name='cluster-worker', daemon=True)
+        self._worker.start()
+        return self._worker
+
+
+# Instância singleton do coordenador
+cluster = ClusterCoordinator()
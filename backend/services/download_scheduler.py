@@ -0,0 +1,360 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Prioridades suportadas (ordem = ordem de atendimento na fila)
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_PREFETCH = 'prefetch'
+PRIORITY_BATCH = 'batch'
+
+PRIORITIES = [PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_BATCH]
+
+# Peso de cada prioridade na divisão de banda e conexões
+PRIORITY_WEIGHTS = {
+    PRIORITY_INTERACTIVE: 4,
+    PRIORITY_PREFETCH: 2,
+    PRIORITY_BATCH: 1,
+}
+
+MIN_CHUNK_SIZE = 1 * 1024 * 1024  # 1MB
+MAX_CHUNK_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Detecção de saturação sem DOWNLOAD_TOTAL_BANDWIDTH: vazão por conexão
+# abaixo desta fração do pico indica que mais conexões não aumentam a vazão
+SATURATION_RATIO = 0.5
+PEAK_DECAY = 0.999  # por amostra, para o pico não ficar preso a uma medição excepcional
+CAPACITY_TTL = 30.0  # segundos até testar de novo o orçamento completo de conexões
+REBALANCE_INTERVAL = 2.0  # segundos entre redistribuições disparadas pelo progresso
+
+
+class SchedulerBusyError(Exception):
+    """Exceção lançada quando não há vaga para o download dentro do tempo limite"""
+    pass
+
+
+class DownloadLease:
+    """Vaga concedida pelo agendador a um download ativo"""
+
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.weight = PRIORITY_WEIGHTS[priority]
+        self.fragments = 1
+        self.chunk_size = MAX_CHUNK_SIZE
+        self.rate_limit = None
+        self.speed = 0.0
+        self.downloaded_bytes = 0
+        self.started_at = time.time()
+        self._params = None
+        self._applied = {}
+
+    def bind(self, params):
+        """
+        Associa o dicionário de parâmetros do YoutubeDL à vaga
+
+        O yt-dlp lê 'ratelimit' a cada bloco baixado e a concorrência de
+        fragmentos/chunk no início de cada formato, então alterar o
+        dicionário durante o download aplica os novos valores sem reiniciá-lo.
+
+        Args:
+            params (dict): ydl.params da instância em uso
+        """
+        self._params = params
+        self._applied = {}
+        self._apply_params()
+
+    def update(self, fragments, chunk_size, rate_limit):
+        self.fragments = fragments
+        self.chunk_size = chunk_size
+        self.rate_limit = rate_limit
+        self._apply_params()
+
+    def _apply_params(self):
+        if self._params is None:
+            return
+        for key, value in self.ydl_options().items():
+            if key == 'progress_hooks' or self._applied.get(key, object()) == value:
+                continue
+            self._params[key] = value
+            self._applied[key] = value
+
+    def ydl_options(self):
+        """
+        Retorna as opções do yt-dlp derivadas da vaga
+
+        Returns:
+            dict: Opções de concorrência, chunk e limite de banda
+        """
+        return {
+            'concurrent_fragment_downloads': self.fragments,
+            'http_chunk_size': self.chunk_size,
+            'ratelimit': self.rate_limit,
+            'progress_hooks': [self.progress_hook],
+        }
+
+    def progress_hook(self, status):
+        """Hook de progresso do yt-dlp usado para medir a vazão real"""
+        if status.get('status') != 'downloading':
+            return
+        speed = status.get('speed')
+        if speed:
+            self.speed = speed
+            self.scheduler.record_throughput(speed / max(self.fragments, 1))
+        self.downloaded_bytes = status.get('downloaded_bytes') or self.downloaded_bytes
+
+    def release(self):
+        self.scheduler.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+class DownloadScheduler:
+    """
+    Agendador de downloads do processo
+
+    Divide um orçamento total de banda e de conexões entre os downloads
+    ativos, ajusta a concorrência de fragmentos de cada download pela vazão
+    medida e pela carga da máquina e atende a fila por prioridade. A cada
+    entrada ou saída de download, e periodicamente durante os downloads, as
+    fatias de todos os ativos são recalculadas.
+
+    Sem limite de banda configurado, a capacidade do link é estimada: quando
+    a vazão por conexão cai para menos da metade do pico, a vazão somada do
+    momento vira o teto e os downloads deixam de receber conexões extras.
+
+    O orçamento vale por processo: com vários processos do gunicorn,
+    DOWNLOAD_TOTAL_BANDWIDTH e DOWNLOAD_MAX_CONNECTIONS devem ser
+    divididos por GUNICORN_WORKERS.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.total_bandwidth = self.config.DOWNLOAD_TOTAL_BANDWIDTH
+        self.max_connections = max(self.config.DOWNLOAD_MAX_CONNECTIONS, 1)
+        self.max_active = max(self.config.DOWNLOAD_MAX_ACTIVE, 1)
+        if self.config.WORKER_POOL_ENABLED:
+            # Vaga sem worker isolado livre só prenderia banda e conexões
+            # esperando o pool, fora da ordem de prioridade da fila
+            self.max_active = min(self.max_active, max(self.config.WORKER_DOWNLOAD_POOL_SIZE, 1))
+        self.max_fragments = max(self.config.DOWNLOAD_MAX_FRAGMENTS_PER_JOB, 1)
+        self.queue_timeout = self.config.DOWNLOAD_QUEUE_TIMEOUT
+
+        self._lock = threading.Condition()
+        self._active = []
+        self._queue = []
+        self._counter = itertools.count()
+        # Média móvel exponencial da vazão por conexão (bytes/s)
+        self._throughput_per_connection = None
+        self._throughput_alpha = 0.3
+        self._peak_throughput_per_connection = None
+        # Capacidade estimada do link quando saturado (bytes/s)
+        self._capacity = None
+        self._capacity_at = 0.0
+        self._last_rebalance = 0.0
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        Aguarda uma vaga para download respeitando a prioridade
+
+        Args:
+            priority (str): 'interactive', 'prefetch' ou 'batch'
+            timeout (float): Tempo máximo de espera em segundos
+
+        Returns:
+            DownloadLease: Vaga com concorrência e limite de banda definidos
+
+        Raises:
+            SchedulerBusyError: Se não houver vaga dentro do tempo limite
+        """
+        if priority not in PRIORITY_WEIGHTS:
+            priority = PRIORITY_INTERACTIVE
+        if timeout is None:
+            timeout = self.queue_timeout
+
+        ticket = (PRIORITIES.index(priority), next(self._counter))
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            while not self._can_start(ticket):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove_ticket(ticket)
+                    self._lock.notify_all()
+                    raise SchedulerBusyError(
+                        "Servidor ocupado: muitos downloads em andamento. Tente novamente em instantes."
+                    )
+                self._lock.wait(remaining)
+
+            heapq.heappop(self._queue)
+            lease = DownloadLease(self, priority)
+            self._active.append(lease)
+            # Divide de novo as conexões: o novo download tira parte da fatia dos ativos
+            self._rebalance()
+            # Outro ticket pode estar apto agora que a fila andou
+            self._lock.notify_all()
+
+        logger.info(
+            f"Vaga de download concedida ({priority}): {lease.fragments} fragmentos, "
+            f"chunk {lease.chunk_size // (1024 * 1024)}MB, limite {lease.rate_limit or 'livre'}"
+        )
+        return lease
+
+    def release(self, lease):
+        """Libera a vaga e redistribui a banda entre os downloads restantes"""
+        with self._lock:
+            if lease in self._active:
+                self._active.remove(lease)
+                self._rebalance()
+                self._lock.notify_all()
+
+    def record_throughput(self, bytes_per_connection):
+        """
+        Atualiza a média de vazão por conexão com uma nova amostra
+
+        No máximo a cada REBALANCE_INTERVAL também reavalia a saturação e
+        redistribui as conexões, para que a vazão medida durante o download
+        (e não só a entrada e saída de downloads) ajuste os fragmentos.
+        """
+        with self._lock:
+            if self._throughput_per_connection is None:
+                self._throughput_per_connection = bytes_per_connection
+            else:
+                alpha = self._throughput_alpha
+                self._throughput_per_connection = (
+                    alpha * bytes_per_connection + (1 - alpha) * self._throughput_per_connection
+                )
+
+            ema = self._throughput_per_connection
+            peak = self._peak_throughput_per_connection
+            self._peak_throughput_per_connection = ema if peak is None else max(ema, peak * PEAK_DECAY)
+
+            now = time.monotonic()
+            if now - self._last_rebalance >= REBALANCE_INTERVAL:
+                self._update_capacity(now)
+                self._rebalance()
+
+    def stats(self):
+        """
+        Retorna o estado atual do agendador
+
+        Returns:
+            dict: Downloads ativos, fila, conexões em uso e vazão medida
+        """
+        with self._lock:
+            return {
+                'active': len(self._active),
+                'queued': len(self._queue),
+                'max_active': self.max_active,
+                'connections_in_use': sum(lease.fragments for lease in self._active),
+                'max_connections': self.max_connections,
+                'total_bandwidth': self.total_bandwidth,
+                'throughput_per_connection': round(self._throughput_per_connection or 0),
+                'estimated_capacity': round(self._capacity or 0),
+                'current_speed': round(sum(lease.speed for lease in self._active)),
+            }
+
+    def _can_start(self, ticket):
+        # Cada download ativo precisa de ao menos uma conexão do orçamento
+        limit = min(self.max_active, self.max_connections)
+        return len(self._active) < limit and self._queue[0] == ticket
+
+    def _remove_ticket(self, ticket):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+
+    def _total_weight(self, extra=0):
+        return sum(lease.weight for lease in self._active) + extra
+
+    def _update_capacity(self, now):
+        """Estima a capacidade do link quando a vazão por conexão indica saturação"""
+        if self.total_bandwidth:
+            return
+        if self._capacity is not None and now - self._capacity_at > CAPACITY_TTL:
+            # Testa de novo com o orçamento completo: o link pode ter melhorado
+            self._capacity = None
+        peak = self._peak_throughput_per_connection
+        if self._capacity is None and peak and self._throughput_per_connection < peak * SATURATION_RATIO:
+            total_speed = sum(lease.speed for lease in self._active)
+            if total_speed:
+                self._capacity = total_speed
+                self._capacity_at = now
+                logger.info(f"Link saturado: capacidade estimada em {round(total_speed)} bytes/s")
+
+    def _plan_fragments(self, total_weight):
+        """
+        Divide o orçamento de conexões entre os downloads ativos pelo peso
+
+        Returns:
+            list: Fragmentos de cada download ativo (soma <= max_connections)
+        """
+        overloaded = self._cpu_load() > 1.5
+        if self.total_bandwidth:
+            bandwidth, per_connection = self.total_bandwidth, self._throughput_per_connection
+        else:
+            bandwidth, per_connection = self._capacity, self._peak_throughput_per_connection
+        plan = []
+        for lease in self._active:
+            fragments = min(self.max_fragments, int(self.max_connections * lease.weight / total_weight))
+
+            # Com limite de banda (configurado ou estimado), conexões além do
+            # necessário para saturar a fatia são desperdício
+            if bandwidth and per_connection:
+                bandwidth_share = bandwidth * lease.weight / total_weight
+                fragments = min(fragments, math.ceil(bandwidth_share / per_connection))
+
+            # Máquina sobrecarregada: reduz a concorrência pela metade
+            if overloaded:
+                fragments = fragments // 2
+
+            plan.append(max(fragments, 1))
+
+        # O mínimo de uma conexão por download pode estourar o orçamento:
+        # tira dos downloads com mais conexões
+        while sum(plan) > self.max_connections:
+            largest = max(range(len(plan)), key=lambda index: plan[index])
+            if plan[largest] <= 1:
+                break
+            plan[largest] -= 1
+        return plan
+
+    def _rebalance(self):
+        """Redistribui conexões, banda e tamanho de chunk entre os downloads ativos"""
+        self._last_rebalance = time.monotonic()
+        if not self._active:
+            return
+        total_weight = self._total_weight()
+        plan = self._plan_fragments(total_weight)
+        for lease, fragments in zip(self._active, plan):
+            if self.total_bandwidth:
+                rate_limit = int(self.total_bandwidth * lease.weight / total_weight)
+                # Chunks de ~4s de transferência na fatia de banda do download
+                chunk_size = rate_limit * 4
+            else:
+                rate_limit = None
+                chunk_size = MAX_CHUNK_SIZE // len(self._active)
+            chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+            lease.update(fragments, chunk_size, rate_limit)
+
+    def _cpu_load(self):
+        """Carga média de 1 minuto normalizada pelo número de CPUs"""
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return 0.0
+
+
+# Instância singleton do agendador
+download_scheduler = DownloadScheduler()
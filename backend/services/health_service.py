@@ -0,0 +1,172 @@
+import logging
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Trechos de mensagens do yt-dlp que indicam falha do YouTube/rede (bloqueio,
+# rate limit, erro HTTP, timeout). Vídeo inexistente, privado ou removido é
+# erro do usuário e não pode tirar a máquina de rotação.
+UPSTREAM_ERROR_MARKERS = (
+    'not a bot',
+    'http error 403',
+    'http error 429',
+    'http error 5',
+    'failed to extract any player response',
+    'unable to download',
+    'timed out',
+    'connection',
+    'name resolution',
+    'remote end closed',
+)
+
+
+class UpstreamTracker:
+    """Janela deslizante de sucessos/falhas das chamadas ao YouTube (yt-dlp)"""
+
+    def __init__(self, window_seconds=300, max_events=1000):
+        self.window_seconds = window_seconds
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def record(self, success):
+        with self._lock:
+            self._events.append((time.time(), bool(success)))
+
+    def record_error(self, error):
+        """
+        Registra o resultado de uma chamada que terminou em erro
+
+        Só conta como falha do YouTube se a mensagem indicar bloqueio, rate
+        limit ou erro de rede; caso contrário o YouTube respondeu (ex: vídeo
+        privado) e a chamada conta como sucesso do upstream.
+        """
+        message = str(error).lower()
+        self.record(not any(marker in message for marker in UPSTREAM_ERROR_MARKERS))
+
+    def stats(self):
+        """
+        Retorna a taxa de erro recente
+
+        Returns:
+            dict: Total de chamadas, falhas e taxa de erro na janela
+        """
+        cutoff = time.time() - self.window_seconds
+        with self._lock:
+            while self._events and self._events[0][0] < cutoff:
+                self._events.popleft()
+            total = len(self._events)
+            failures = sum(1 for _, success in self._events if not success)
+        return {
+            'window_seconds': self.window_seconds,
+            'requests': total,
+            'failures': failures,
+            'error_rate': round(failures / total, 3) if total else 0.0,
+        }
+
+
+class HealthService:
+    """Verificações de liveness e readiness usadas por Fly/nginx para balanceamento"""
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.download_dir = Path(self.config.DOWNLOAD_FOLDER)
+
+    def liveness(self):
+        """O processo está de pé e respondendo"""
+        return {
+            'status': 'healthy',
+            'service': 'stream2downloader'
+        }
+
+    def readiness(self):
+        """
+        Avalia se esta máquina tem capacidade para novas requisições
+
+        Returns:
+            tuple: (pronto, payload) - payload com downloads em andamento,
+                fila, disco, taxa de erro do YouTube, cache e workers
+        """
+        from services.cluster import cluster
+        from services.download_scheduler import download_scheduler
+        from services.job_store import job_store
+        from services.process_pool import extract_pool, download_pool
+        from services.youtube_service import youtube_service
+
+        scheduler = download_scheduler.stats()
+        disk = self._disk_stats()
+        upstream = upstream_tracker.stats()
+        cache = youtube_service.cache_stats()
+
+        try:
+            in_flight = job_store.count_running()
+        except Exception as e:
+            logger.error(f"Erro ao consultar jobs em andamento: {str(e)}")
+            in_flight = scheduler['active']
+
+        # Só sinais da máquina inteira: a fila do agendador é de um processo só
+        # e depende de qual processo do gunicorn atendeu a verificação
+        reasons = []
+        if in_flight >= self.config.READY_MAX_INFLIGHT_DOWNLOADS:
+            reasons.append('too_many_downloads')
+        if disk['free_bytes'] < self.config.READY_MIN_FREE_DISK:
+            reasons.append('low_disk_space')
+        if disk['used_bytes'] > self.config.DOWNLOAD_DISK_BUDGET:
+            reasons.append('disk_budget_exceeded')
+        # Bloqueio/rate limit do YouTube atinge todas as máquinas ao mesmo tempo:
+        # é só informativo, não tira a máquina de rotação
+        upstream['degraded'] = upstream['requests'] >= self.config.READY_MIN_UPSTREAM_SAMPLES \
+            and upstream['error_rate'] > self.config.READY_MAX_UPSTREAM_ERROR_RATE
+
+        ready = not reasons
+        payload = {
+            'status': 'ready' if ready else 'unavailable',
+            'service': 'stream2downloader',
+            'reasons': reasons,
+            'downloads': {
+                'in_flight': in_flight,
+                'max_in_flight': self.config.READY_MAX_INFLIGHT_DOWNLOADS,
+                **scheduler,
+            },
+            'disk': disk,
+            'upstream': upstream,
+            'cache': cache,
+            # Pico de memória, mortes e reciclagens dos workers isolados
+            'workers': {
+                'extract': extract_pool.stats(),
+                'download': download_pool.stats(),
+            },
+        }
+        if cluster.enabled:
+            payload['cluster'] = {
+                'node_id': cluster.node_id,
+                'queue_depth': cluster.queue_depth(),
+            }
+        return ready, payload
+
+    def _disk_stats(self):
+        """Espaço livre no volume e espaço usado por downloads/ contra o orçamento"""
+        usage = shutil.disk_usage(self.download_dir)
+        used = 0
+        for file_path in self.download_dir.iterdir():
+            try:
+                if file_path.is_file():
+                    used += file_path.stat().st_size
+            except OSError:
+                # Arquivo removido durante a varredura
+                continue
+        return {
+            'free_bytes': usage.free,
+            'min_free_bytes': self.config.READY_MIN_FREE_DISK,
+            'used_bytes': used,
+            'budget_bytes': self.config.DOWNLOAD_DISK_BUDGET,
+        }
+
+
+# Instâncias singleton
+upstream_tracker = UpstreamTracker()
+health_service = HealthService()
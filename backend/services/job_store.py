@@ -0,0 +1,316 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Estados possíveis de um job
+STATUS_RUNNING = 'running'
+STATUS_INTERRUPTED = 'interrupted'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    quality TEXT NOT NULL,
+    download_type TEXT NOT NULL,
+    format TEXT NOT NULL,
+    output_template TEXT NOT NULL,
+    file_path TEXT,
+    title TEXT,
+    status TEXT NOT NULL,
+    owner TEXT,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def make_job_id(video_id, download_type, quality):
+    """
+    Gera o ID determinístico de um job
+
+    O mesmo vídeo, tipo e qualidade sempre caem no mesmo job, de forma que
+    uma nova requisição reaproveita os arquivos .part de uma tentativa anterior.
+    O ID também é o prefixo de todos os arquivos do job em downloads/.
+
+    Returns:
+        str: ID do job (sem pontos, para servir de prefixo de arquivo)
+    """
+    return f"{video_id}-{download_type}-{quality}".replace('.', '_')
+
+
+def _boot_id():
+    """ID do boot atual do kernel (Linux); vazio se indisponível"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as boot_file:
+            return boot_file.read().strip()
+    except OSError:
+        return ''
+
+
+def _process_start_time(pid):
+    """
+    Instante de início do processo em ticks desde o boot (Linux)
+
+    Returns:
+        str: Campo starttime de /proc/<pid>/stat, '-' se o processo não
+            existir ou '' sem /proc
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as stat_file:
+            stat = stat_file.read()
+    except FileNotFoundError:
+        return '' if not os.path.isdir('/proc') else '-'
+    except OSError:
+        return ''
+    # Campos após o nome do processo (entre parênteses); starttime é o 22º
+    return stat.rsplit(b')', 1)[1].split()[19].decode()
+
+
+def job_id_from_filename(filename):
+    """Extrai o ID do job a partir do nome de um arquivo em downloads/"""
+    return filename.split('.', 1)[0]
+
+
+class JobStore:
+    """
+    Persistência local (SQLite) do estado dos downloads
+
+    Guarda URL, plano de formato, caminho de saída e bytes baixados de cada
+    job para que downloads interrompidos (worker morto pelo timeout do
+    gunicorn, máquina parada) possam ser retomados a partir dos arquivos
+    .part/fragmentos via suporte de continuação do yt-dlp.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.JOB_STORE_PATH
+        self._hostname = socket.gethostname()
+        self._boot_id = _boot_id()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn = sqlite3.connect(self.db_path, timeout=10)
+                    try:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute(_SCHEMA)
+                        conn.commit()
+                    finally:
+                        conn.close()
+                    self._initialized = True
+
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def owner_token(self):
+        """
+        Identifica o processo/thread dono de um job
+
+        Inclui o boot_id do kernel e o instante de início do processo: o
+        hostname se repete entre reinícios de container/máquina Fly e PIDs
+        são reaproveitados, então hostname:pid sozinho pode apontar para
+        um processo vivo que não é o dono original.
+        """
+        pid = os.getpid()
+        return f"{self._hostname}:{self._boot_id}:{pid}:{_process_start_time(pid)}:{threading.get_ident()}"
+
+    def _owner_alive(self, owner):
+        """Verifica se o dono registrado de um job ainda está em execução"""
+        if not owner:
+            return False
+        try:
+            hostname, boot_id, pid, start_time, thread_id = owner.rsplit(':', 4)
+            pid, thread_id = int(pid), int(thread_id)
+        except ValueError:
+            return False
+
+        # O job store é local à máquina: outro hostname é um container
+        # anterior que usava o mesmo volume (ex: docker compose recriado)
+        if hostname != self._hostname:
+            return False
+
+        # Mesmo hostname mas outro boot: a máquina reiniciou desde então
+        if boot_id != self._boot_id:
+            return False
+
+        # PID reaproveitado por outro processo
+        if start_time != _process_start_time(pid):
+            return False
+
+        if pid == os.getpid():
+            return any(thread.ident == thread_id for thread in threading.enumerate())
+
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def claim(self, job):
+        """
+        Tenta assumir um job para execução
+
+        Args:
+            job (dict): job_id, url, video_id, quality, download_type, format e output_template
+
+        Returns:
+            bool: True se o job foi assumido; False se outro dono vivo já o executa
+        """
+        now = time.time()
+        owner = self.owner_token()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT status, owner FROM jobs WHERE job_id = ?', (job['job_id'],)
+                ).fetchone()
+
+                if row and row['status'] == STATUS_RUNNING and row['owner'] != owner \
+                        and self._owner_alive(row['owner']):
+                    conn.execute('ROLLBACK')
+                    return False
+
+                if row:
+                    conn.execute(
+                        'UPDATE jobs SET url = ?, format = ?, output_template = ?, status = ?, '
+                        'owner = ?, updated_at = ? WHERE job_id = ?',
+                        (job['url'], job['format'], job['output_template'], STATUS_RUNNING,
+                         owner, now, job['job_id'])
+                    )
+                else:
+                    conn.execute(
+                        'INSERT INTO jobs (job_id, url, video_id, quality, download_type, format, '
+                        'output_template, status, owner, created_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (job['job_id'], job['url'], job['video_id'], job['quality'],
+                         job['download_type'], job['format'], job['output_template'],
+                         STATUS_RUNNING, owner, now, now)
+                    )
+                conn.execute('COMMIT')
+                return True
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def get(self, job_id):
+        """Retorna o job como dicionário ou None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update_progress(self, job_id, bytes_done, total_bytes=None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET bytes_done = ?, total_bytes = COALESCE(?, total_bytes), '
+                'updated_at = ? WHERE job_id = ?',
+                (bytes_done, total_bytes, time.time(), job_id)
+            )
+
+    def complete(self, job_id, file_path, title, file_size):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, file_path = ?, title = ?, bytes_done = ?, '
+                'total_bytes = ?, owner = NULL, updated_at = ? WHERE job_id = ?',
+                (STATUS_COMPLETED, file_path, title, file_size, file_size, time.time(), job_id)
+            )
+
+    def fail(self, job_id):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE job_id = ?',
+                (STATUS_FAILED, time.time(), job_id)
+            )
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def count_running(self):
+        """Número de jobs em execução por donos vivos nesta máquina"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT owner FROM jobs WHERE status = ?', (STATUS_RUNNING,)
+            ).fetchall()
+        return sum(1 for row in rows if self._owner_alive(row['owner']))
+
+    def recover_interrupted(self):
+        """
+        Marca como interrompidos os jobs cujo dono morreu
+
+        Returns:
+            list: Jobs interrompidos que podem ser retomados
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT job_id, owner FROM jobs WHERE status = ?', (STATUS_RUNNING,)
+            ).fetchall()
+            for row in rows:
+                if not self._owner_alive(row['owner']):
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, owner = NULL WHERE job_id = ? AND owner = ?',
+                        (STATUS_INTERRUPTED, row['job_id'], row['owner'])
+                    )
+                    logger.info(f"Job interrompido detectado: {row['job_id']}")
+
+            interrupted = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY updated_at', (STATUS_INTERRUPTED,)
+            ).fetchall()
+        return [dict(row) for row in interrupted]
+
+    def live_job_ids(self, max_age_seconds):
+        """
+        IDs dos jobs cujos arquivos não devem ser removidos
+
+        Um job está vivo se tem dono em execução ou foi atualizado há menos
+        de max_age_seconds (pode ainda ser retomado).
+        """
+        cutoff = time.time() - max_age_seconds
+        with self._connect() as conn:
+            rows = conn.execute('SELECT job_id, status, owner, updated_at FROM jobs').fetchall()
+        return {
+            row['job_id'] for row in rows
+            if row['updated_at'] >= cutoff
+            or (row['status'] == STATUS_RUNNING and self._owner_alive(row['owner']))
+        }
+
+    def purge(self, max_age_seconds):
+        """
+        Remove do banco os jobs abandonados
+
+        Returns:
+            list: IDs dos jobs removidos
+        """
+        keep = self.live_job_ids(max_age_seconds)
+        cutoff = time.time() - max_age_seconds
+        with self._connect() as conn:
+            rows = conn.execute('SELECT job_id FROM jobs').fetchall()
+            abandoned = [row['job_id'] for row in rows if row['job_id'] not in keep]
+            conn.executemany(
+                'DELETE FROM jobs WHERE job_id = ? AND updated_at < ?',
+                [(job_id, cutoff) for job_id in abandoned]
+            )
+        return abandoned
+
+# Instância singleton do repositório de jobs
+job_store = JobStore()
@@ -0,0 +1,671 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from config import Config
+from services.download_scheduler import SchedulerBusyError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 0.5  # segundos entre mensagens de progresso do worker
+RSS_SAMPLE_INTERVAL = 0.5  # segundos entre medições de memória
+SLOT_POLL_INTERVAL = 0.2  # segundos entre tentativas de obter vaga na máquina
+REAP_INTERVAL = 0.5  # segundos entre verificações de workers ociosos
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Motivos para matar um worker
+KILL_MEMORY = 'memory'
+KILL_TIMEOUT = 'timeout'
+KILL_CANCELLED = 'cancelled'
+KILL_CRASHED = 'crashed'
+
+
+class WorkerTaskError(Exception):
+    """Erro levantado pela tarefa dentro do worker (mensagem original preservada)"""
+    pass
+
+
+class WorkerKilledError(Exception):
+    """Tarefa interrompida: worker morto por memória, tempo, cancelamento ou crash"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class WorkerPoolBusyError(SchedulerBusyError):
+    """Nenhum worker livre dentro do tempo limite"""
+    pass
+
+
+# Lado do worker (processo isolado)
+
+class _ChildTask:
+    """Contexto da tarefa no worker: envia progresso e aplica controles do processo web"""
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+        self._params = None
+        self._pending = {}
+        self._last_progress = 0.0
+
+    def bind_params(self, params):
+        self._params = params
+        self._apply_controls()
+
+    def progress_hook(self, status):
+        self._apply_controls()
+        now = time.monotonic()
+        if status.get('status') == 'downloading' and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        payload = {
+            key: status.get(key)
+            for key in ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'speed')
+        }
+        with self._lock:
+            self._conn.send(('progress', payload))
+
+    def _apply_controls(self):
+        with self._lock:
+            while self._conn.poll():
+                kind, data = self._conn.recv()
+                if kind == 'control':
+                    self._pending.update(data)
+        if self._params is not None and self._pending:
+            self._params.update(self._pending)
+            self._pending = {}
+
+
+def _max_rss_bytes(who):
+    if resource is None:
+        return 0
+    # ru_maxrss em KB no Linux
+    return resource.getrusage(who).ru_maxrss * 1024
+
+
+def _worker_main(conn, max_tasks):
+    """Loop do processo worker: executa tarefas até ser reciclado"""
+    # Grupo de processos próprio para que ffmpeg e afins morram junto com o worker
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    # Entre duas medições de RSS a tarefa pode estourar a memória da VM; com o
+    # ajuste máximo o OOM killer do kernel escolhe este worker (ou o ffmpeg,
+    # que herda o valor) em vez do processo web
+    try:
+        with open('/proc/self/oom_score_adj', 'w') as f:
+            f.write('1000')
+    except OSError:
+        pass
+    lock = threading.Lock()
+    completed = 0
+
+    while max_tasks <= 0 or completed < max_tasks:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        kind, payload = message
+        if kind != 'task':
+            # Controle atrasado de uma tarefa que já terminou
+            continue
+
+        func, args = payload
+        task = _ChildTask(conn, lock)
+        try:
+            reply = ('result', func(*args, task))
+        except Exception as e:
+            reply = ('error', str(e))
+
+        telemetry = {
+            'worker_maxrss_bytes': _max_rss_bytes(resource.RUSAGE_SELF) if resource else 0,
+            'children_maxrss_bytes': _max_rss_bytes(resource.RUSAGE_CHILDREN) if resource else 0,
+        }
+        with lock:
+            conn.send((reply[0], reply[1], telemetry))
+        completed += 1
+
+
+# Lado do processo web
+
+class _LocalTask:
+    """Contexto da tarefa quando o pool está desabilitado (execução no próprio processo)"""
+
+    def __init__(self, on_progress, on_start):
+        self._on_progress = on_progress
+        self._on_start = on_start
+
+    def bind_params(self, params):
+        if self._on_start:
+            self._on_start(params)
+
+    def progress_hook(self, status):
+        if self._on_progress:
+            self._on_progress(status)
+
+
+class _RemoteParams:
+    """Repassa alterações de parâmetros (ex: ratelimit) para o worker em execução"""
+
+    def __init__(self, worker):
+        self._worker = worker
+
+    def __setitem__(self, key, value):
+        try:
+            self._worker.send(('control', {key: value}))
+        except (OSError, ValueError):
+            pass
+
+
+class _MachineSlots:
+    """
+    Vagas de worker compartilhadas por todos os processos da máquina
+
+    Cada vaga é um arquivo de lock (flock) em DOWNLOAD_DIR/.workers. O
+    lock é liberado pelo kernel se o processo web morrer, então vagas
+    nunca ficam presas. Sem fcntl (Windows) o limite vale só por processo.
+
+    Quem espera vaga cria um arquivo de espera; um processo com worker
+    ocioso que vê espera de outro processo encerra o worker e libera a
+    vaga em vez de mantê-la até o idle_timeout.
+    """
+
+    def __init__(self, directory, name, count):
+        self.directory = directory
+        self.name = name
+        self.count = count
+
+    def try_acquire(self):
+        """
+        Returns:
+            int: Descritor do lock da vaga, -1 sem suporte a flock, ou None se não houver vaga
+        """
+        if fcntl is None:
+            return -1
+        os.makedirs(self.directory, exist_ok=True)
+        for index in range(self.count):
+            fd = os.open(os.path.join(self.directory, f'{self.name}-{index}.lock'), os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd):
+        if fd is not None and fd >= 0:
+            os.close(fd)
+
+    def announce_waiter(self):
+        """Registra que esta thread aguarda vaga; retorna o caminho do arquivo de espera"""
+        if fcntl is None:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self.name}.wait.{os.getpid()}.{threading.get_ident()}')
+        with open(path, 'w'):
+            pass
+        return path
+
+    @staticmethod
+    def withdraw_waiter(path):
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def others_waiting(self):
+        """Há processos vivos (além deste) aguardando vaga deste pool?"""
+        if fcntl is None:
+            return False
+        prefix = f'{self.name}.wait.'
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return False
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            try:
+                pid = int(name[len(prefix):].split('.', 1)[0])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                # Arquivo deixado por um processo que morreu esperando
+                self.withdraw_waiter(os.path.join(self.directory, name))
+                continue
+            except PermissionError:
+                pass
+            return True
+        return False
+
+
+class _Worker:
+    def __init__(self, context, max_tasks, slot):
+        self.slot = slot
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, max_tasks), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.healthy = True
+        self.idle_since = None
+        self._send_lock = threading.Lock()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def kill(self):
+        """Mata o worker e todo o seu grupo de processos (ffmpeg incluído)"""
+        self.healthy = False
+        try:
+            # Só usa killpg se o worker já estiver no próprio grupo
+            if hasattr(os, 'killpg') and os.getpgid(self.pid) == self.pid:
+                os.killpg(self.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+        self.process.join(5)
+        self.conn.close()
+        self._release_slot()
+
+    def stop(self):
+        try:
+            self.send(None)
+            self.process.join(5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+            self._release_slot()
+
+    def _release_slot(self):
+        # A vaga só volta para a máquina depois que o processo terminou
+        slot, self.slot = self.slot, None
+        _MachineSlots.release(slot)
+
+
+def _tree_rss(pid):
+    """
+    RSS somado do processo e de todos os seus descendentes (Linux /proc)
+
+    Returns:
+        int: Bytes residentes, ou None se /proc não estiver disponível
+    """
+    children = {}
+    try:
+        entries = os.scandir('/proc')
+    except FileNotFoundError:
+        return None
+
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry.name}/stat', 'rb') as stat_file:
+                    stat = stat_file.read()
+            except OSError:
+                continue
+            parent_pid = int(stat.rsplit(b')', 1)[1].split()[1])
+            children.setdefault(parent_pid, []).append(int(entry.name))
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/statm', 'rb') as statm_file:
+                total += int(statm_file.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children.get(current, ()))
+    return total
+
+
+class IsolatedPool:
+    """
+    Pool limitado de processos para trabalho pesado (yt-dlp, ffmpeg)
+
+    Cada tarefa roda em um processo worker separado com limite de RSS
+    (worker + descendentes) e de tempo. Estourar um limite mata só aquele
+    worker; o processo web continua atendendo. Workers são reciclados
+    após max_tasks tarefas, encerrados após idle_timeout sem uso e podem
+    ser cancelados a qualquer momento.
+
+    `size` é o número de workers vivos na máquina inteira (somando todos
+    os processos do gunicorn/uvicorn), garantido pelas vagas em slot_dir.
+    """
+
+    def __init__(self, name, size, max_rss, max_tasks, idle_timeout=0, slot_dir=None, enabled=True):
+        self.name = name
+        self.size = max(size, 1)
+        self.max_rss = max_rss
+        self.max_tasks = max_tasks
+        self.idle_timeout = idle_timeout
+        self.enabled = enabled
+
+        self._context = multiprocessing.get_context('spawn')
+        self._slots = _MachineSlots(slot_dir or os.path.join(Config.DOWNLOAD_FOLDER, '.workers'), name, self.size)
+        self._cond = threading.Condition()
+        self._idle = []
+        self._workers = 0
+        self._busy = 0
+        self._reaper = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'tasks': 0,
+            'failed': 0,
+            'recycled': 0,
+            'reaped': 0,
+            'killed': {KILL_MEMORY: 0, KILL_TIMEOUT: 0, KILL_CANCELLED: 0, KILL_CRASHED: 0},
+            'peak_rss_bytes': 0,
+            'last_task_peak_rss_bytes': 0,
+            'children_maxrss_bytes': 0,
+        }
+
+    def run(self, func, args, timeout, on_progress=None, on_start=None, cancel_event=None,
+            wait_timeout=None):
+        """
+        Executa func(*args, task) em um worker isolado
+
+        Args:
+            func (callable): Função de nível de módulo (precisa ser importável no worker)
+            args (tuple): Argumentos serializáveis
+            timeout (float): Tempo máximo da tarefa em segundos
+            on_progress (callable): Recebe os dicts de progresso enviados pela tarefa
+            on_start (callable): Recebe um objeto para alterar parâmetros da tarefa em execução
+            cancel_event (threading.Event): Cancela a tarefa quando setado
+            wait_timeout (float): Tempo máximo aguardando um worker livre
+
+        Returns:
+            Valor retornado por func
+
+        Raises:
+            WorkerTaskError: Erro levantado pela tarefa
+            WorkerKilledError: Worker morto por memória, tempo, cancelamento ou crash
+            WorkerPoolBusyError: Nenhum worker livre dentro de wait_timeout
+        """
+        if not self.enabled:
+            return func(*args, _LocalTask(on_progress, on_start))
+
+        worker = self._acquire(wait_timeout)
+        try:
+            return self._execute(worker, func, args, timeout, on_progress, on_start, cancel_event)
+        finally:
+            self._release(worker)
+
+    def stats(self):
+        """Telemetria do pool (tarefas, workers mortos por motivo e picos de memória)"""
+        with self._cond:
+            workers = {'workers': self._workers, 'busy': self._busy}
+        with self._stats_lock:
+            return {
+                'name': self.name,
+                'enabled': self.enabled,
+                'size': self.size,
+                'machine_wide': fcntl is not None,
+                'max_rss_bytes': self.max_rss,
+                'idle_timeout': self.idle_timeout,
+                'max_tasks_per_worker': self.max_tasks,
+                **workers,
+                **self._stats,
+                'killed': dict(self._stats['killed']),
+            }
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._workers -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+    def _acquire(self, wait_timeout):
+        deadline = None if wait_timeout is None else time.monotonic() + wait_timeout
+        waiter = None
+        try:
+            with self._cond:
+                while True:
+                    if self._idle:
+                        worker = self._idle.pop()
+                        if worker.process.is_alive():
+                            self._busy += 1
+                            return worker
+                        self._workers -= 1
+                        worker.stop()
+                        continue
+                    if self._workers < self.size:
+                        slot = self._slots.try_acquire()
+                        if slot is not None:
+                            self._workers += 1
+                            self._busy += 1
+                            break
+                        if waiter is None:
+                            # Pede a outros processos que liberem vagas ociosas
+                            waiter = self._slots.announce_waiter()
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise WorkerPoolBusyError(
+                            "Servidor ocupado: todos os workers de processamento estão em uso. Tente novamente em instantes."
+                        )
+                    # Vagas de outros processos não notificam esta Condition: consulta periódica
+                    self._cond.wait(SLOT_POLL_INTERVAL if remaining is None else min(remaining, SLOT_POLL_INTERVAL))
+        finally:
+            _MachineSlots.withdraw_waiter(waiter)
+
+        try:
+            worker = _Worker(self._context, self.max_tasks, slot)
+        except Exception:
+            _MachineSlots.release(slot)
+            with self._cond:
+                self._workers -= 1
+                self._busy -= 1
+                self._cond.notify()
+            raise
+        self._start_reaper()
+        return worker
+
+    def _release(self, worker):
+        recycle = self.max_tasks > 0 and worker.tasks >= self.max_tasks
+        # Outro processo esperando vaga: devolve a vaga em vez de ficar ocioso
+        yield_slot = self._slots.others_waiting()
+        keep = worker.healthy and not recycle and not yield_slot and worker.process.is_alive()
+        with self._cond:
+            self._busy -= 1
+            if keep:
+                worker.idle_since = time.monotonic()
+                self._idle.append(worker)
+            else:
+                self._workers -= 1
+            self._cond.notify()
+
+        if not keep:
+            if recycle and worker.healthy:
+                with self._stats_lock:
+                    self._stats['recycled'] += 1
+                logger.info(f"Worker {self.name} reciclado após {worker.tasks} tarefas")
+            worker.stop()
+
+    def _start_reaper(self):
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name=f'{self.name}-reaper', daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        """
+        Encerra workers ociosos há mais de idle_timeout, ou imediatamente
+        se outro processo estiver esperando vaga (devolve memória e vaga)
+        """
+        while True:
+            time.sleep(REAP_INTERVAL)
+            with self._cond:
+                has_idle = bool(self._idle)
+            if not has_idle:
+                continue
+            if self._slots.others_waiting():
+                cutoff = float('inf')
+            elif self.idle_timeout > 0:
+                cutoff = time.monotonic() - self.idle_timeout
+            else:
+                continue
+            with self._cond:
+                expired = [worker for worker in self._idle if worker.idle_since <= cutoff]
+                if not expired:
+                    continue
+                self._idle = [worker for worker in self._idle if worker.idle_since > cutoff]
+                self._workers -= len(expired)
+            for worker in expired:
+                worker.stop()
+            with self._stats_lock:
+                self._stats['reaped'] += len(expired)
+
+    def _kill(self, worker, reason, message, peak=0):
+        worker.kill()
+        with self._stats_lock:
+            self._stats['killed'][reason] += 1
+            self._stats['failed'] += 1
+            self._stats['peak_rss_bytes'] = max(self._stats['peak_rss_bytes'], peak)
+        logger.warning(f"Worker {self.name} (pid {worker.pid}) interrompido: {message}")
+        raise WorkerKilledError(reason, message)
+
+    def _execute(self, worker, func, args, timeout, on_progress, on_start, cancel_event):
+        started = time.monotonic()
+        next_sample = started
+        peak = 0
+
+        worker.send(('task', (func, args)))
+        if on_start:
+            on_start(_RemoteParams(worker))
+
+        while True:
+            now = time.monotonic()
+            if cancel_event is not None and cancel_event.is_set():
+                self._kill(worker, KILL_CANCELLED, "tarefa cancelada", peak)
+            if timeout and now - started > timeout:
+                self._kill(worker, KILL_TIMEOUT, f"tarefa excedeu o limite de {timeout}s", peak)
+            if now >= next_sample:
+                next_sample = now + RSS_SAMPLE_INTERVAL
+                rss = _tree_rss(worker.pid)
+                if rss is not None:
+                    peak = max(peak, rss)
+                    if self.max_rss and rss > self.max_rss:
+                        self._kill(
+                            worker, KILL_MEMORY,
+                            f"tarefa excedeu o limite de memória ({rss // (1024 * 1024)}MB > "
+                            f"{self.max_rss // (1024 * 1024)}MB)",
+                            peak
+                        )
+
+            try:
+                if not worker.conn.poll(0.2):
+                    continue
+                kind, payload, *telemetry = worker.conn.recv()
+            except (EOFError, OSError):
+                # Worker morreu sem responder; SIGKILL que não partiu do pool
+                # vem do OOM killer do kernel (oom_score_adj=1000 no worker)
+                worker.process.join(1)
+                if worker.process.exitcode == -getattr(signal, 'SIGKILL', 9):
+                    self._kill(worker, KILL_MEMORY, "worker morto pelo kernel por falta de memória", peak)
+                self._kill(worker, KILL_CRASHED, "worker terminou inesperadamente", peak)
+
+            if kind == 'progress':
+                if on_progress:
+                    try:
+                        on_progress(payload)
+                    except Exception as e:
+                        logger.warning(f"Erro no hook de progresso: {str(e)}")
+                continue
+
+            worker.tasks += 1
+            self._record_task(peak, telemetry[0] if telemetry else {}, now - started, kind == 'error')
+            if kind == 'error':
+                raise WorkerTaskError(payload)
+            return payload
+
+    def _record_task(self, peak, telemetry, elapsed, failed):
+        with self._stats_lock:
+            self._stats['tasks'] += 1
+            if failed:
+                self._stats['failed'] += 1
+            self._stats['last_task_peak_rss_bytes'] = peak
+            self._stats['peak_rss_bytes'] = max(self._stats['peak_rss_bytes'], peak)
+            self._stats['children_maxrss_bytes'] = max(
+                self._stats['children_maxrss_bytes'], telemetry.get('children_maxrss_bytes', 0)
+            )
+        logger.info(
+            f"Tarefa {self.name} concluída em {elapsed:.1f}s, "
+            f"pico de memória {peak / (1024 * 1024):.1f}MB"
+        )
+
+
+def _task_max_rss():
+    """WORKER_MAX_RSS limitado para que todas as vagas da máquina caibam em WORKER_MEMORY_BUDGET"""
+    slots = max(Config.WORKER_EXTRACT_POOL_SIZE, 1) + max(Config.WORKER_DOWNLOAD_POOL_SIZE, 1)
+    max_rss = Config.WORKER_MAX_RSS
+    budget = Config.WORKER_MEMORY_BUDGET
+    if budget and slots * max_rss > budget:
+        max_rss = budget // slots
+        logger.warning(
+            f"WORKER_MAX_RSS reduzido para {max_rss // (1024 * 1024)}MB: {slots} vagas "
+            f"não cabem em WORKER_MEMORY_BUDGET ({budget // (1024 * 1024)}MB)"
+        )
+    return max_rss
+
+
+# Pools separados: extração (validação) nunca espera por downloads pesados.
+# Tamanhos valem para a máquina inteira, não por processo do gunicorn.
+_max_rss = _task_max_rss()
+extract_pool = IsolatedPool(
+    'extract',
+    size=Config.WORKER_EXTRACT_POOL_SIZE,
+    max_rss=_max_rss,
+    max_tasks=Config.WORKER_MAX_TASKS,
+    idle_timeout=Config.WORKER_IDLE_TIMEOUT,
+    enabled=Config.WORKER_POOL_ENABLED,
+)
+download_pool = IsolatedPool(
+    'download',
+    size=Config.WORKER_DOWNLOAD_POOL_SIZE,
+    max_rss=_max_rss,
+    max_tasks=Config.WORKER_MAX_TASKS,
+    idle_timeout=Config.WORKER_IDLE_TIMEOUT,
+    enabled=Config.WORKER_POOL_ENABLED,
+)
+
+atexit.register(extract_pool.shutdown)
+atexit.register(download_pool.shutdown)
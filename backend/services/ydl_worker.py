@@ -0,0 +1,30 @@
+import yt_dlp
+
+# Campos do info_dict devolvidos ao processo web. O info_dict completo (com a
+# lista de formatos) fica no processo isolado e é descartado junto com ele.
+INFO_FIELDS = ('id', 'title', 'thumbnail', 'duration', 'uploader', 'channel', 'ext')
+
+
+def run_ydl(ydl_opts, url, download, task):
+    """
+    Executa o yt-dlp (extração ou download) dentro de um worker do pool
+
+    Args:
+        ydl_opts (dict): Opções do YoutubeDL (sem progress_hooks)
+        url (str): URL canônica do vídeo
+        download (bool): Baixar o arquivo ou só extrair informações
+        task: Contexto da tarefa (progresso e controle de banda)
+
+    Returns:
+        dict: 'info' com os campos de INFO_FIELDS e 'filename' do arquivo
+    """
+    options = {**ydl_opts, 'progress_hooks': [task.progress_hook]}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        task.bind_params(ydl.params)
+        info = ydl.extract_info(url, download=download)
+        filename = ydl.prepare_filename(info) if download else None
+
+    return {
+        'info': {field: info.get(field) for field in INFO_FIELDS},
+        'filename': filename,
+    }
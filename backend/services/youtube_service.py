@@ -1,11 +1,38 @@
-import yt_dlp
 import os
 import logging
+import threading
 import time
 from pathlib import Path
 from config import Config
+from services.download_scheduler import (
+    download_scheduler,
+    SchedulerBusyError,
+    PRIORITIES,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_PREFETCH,
+    PRIORITY_BATCH
+)
+from services.cluster import cluster
+from services.health_service import upstream_tracker
+from services.process_pool import (
+    extract_pool,
+    download_pool,
+    WorkerKilledError,
+    WorkerPoolBusyError
+)
+from services.ydl_worker import run_ydl
+from services.job_store import (
+    job_store,
+    make_job_id,
+    job_id_from_filename,
+    STATUS_COMPLETED
+)
 from utils.validators import (
-    validate_youtube_url, 
+    validate_youtube_url,
+    parse_youtube_url,
+    canonical_youtube_url,
+    validate_quality,
+    validate_download_type,
     ValidationError,
     validate_duration,
     sanitize_filename
@@ -22,6 +49,9 @@ class YouTubeService:
         # Cache simples para evitar re-extração de info (TTL: 5 minutos)
         self._info_cache = {}
         self._cache_ttl = 300  # 5 minutos
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cleanup_thread = None
     
     def _get_cached_info(self, video_id):
         """Retorna info do cache se ainda válida"""
@@ -29,12 +59,38 @@ class YouTubeService:
             cached = self._info_cache[video_id]
             if time.time() - cached['timestamp'] < self._cache_ttl:
                 logger.info(f"Usando cache para vídeo: {video_id}")
+                self._cache_hits += 1
                 return cached['data']
             else:
                 # Cache expirado, remove
                 del self._info_cache[video_id]
+        
+        # Cache compartilhado entre máquinas (quando o cluster está habilitado)
+        try:
+            shared = cluster.get_info(video_id, self._cache_ttl)
+        except Exception as e:
+            logger.warning(f"Erro ao consultar cache do cluster: {str(e)}")
+            shared = None
+        if shared:
+            logger.info(f"Usando cache do cluster para vídeo: {video_id}")
+            self._info_cache[video_id] = {'data': shared, 'timestamp': time.time()}
+            self._cache_hits += 1
+            return shared
+        
+        self._cache_misses += 1
         return None
 
+    def cache_stats(self):
+        """Estatísticas do cache de informações de vídeo"""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            'entries': len(self._info_cache),
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'hit_rate': round(self._cache_hits / lookups, 3) if lookups else 0.0,
+            'ttl_seconds': self._cache_ttl,
+        }
+
     def _apply_auth_options(self, options):
         """Aplica opções de autenticação do YouTube quando configuradas."""
         cookie_file = self.config.YT_COOKIES_FILE
@@ -69,13 +125,14 @@ class YouTubeService:
             ValidationError: Se houver erro na extração
         """
         try:
-            # Valida URL e extrai video ID
-            video_id = validate_youtube_url(url)
+            # Valida URL e extrai video ID; todas as variantes viram a mesma URL canônica
+            video_id, start_time = parse_youtube_url(url)
+            url = canonical_youtube_url(video_id)
             
             # Verifica cache primeiro
             cached_info = self._get_cached_info(video_id)
             if cached_info:
-                return cached_info
+                return {**cached_info, 'start_time': start_time}
             
             ydl_opts = {
                 'quiet': True,
@@ -106,9 +163,9 @@ class YouTubeService:
             ydl_opts = self._apply_auth_options(ydl_opts)
 
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    logger.info(f"Extraindo informações do vídeo: {video_id}")
-                    info = ydl.extract_info(url, download=False)
+                logger.info(f"Extraindo informações do vídeo: {video_id}")
+                info = self._extract_isolated(ydl_opts, url)
+                upstream_tracker.record(True)
             except Exception as first_error:
                 first_error_text = str(first_error)
                 if "Failed to extract any player response" not in first_error_text:
@@ -126,42 +183,50 @@ class YouTubeService:
                     'fragment_retries': 4,
                 }
 
-                with yt_dlp.YoutubeDL(fallback_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                
-                # Valida duração
-                duration = info.get('duration', 0)
-                validate_duration(duration, self.config.MAX_VIDEO_DURATION)
-                
-                # Qualidades padrão (não extrai de formatos para economizar tempo)
-                qualities = self._get_available_qualities(info)
-                
-                result = {
-                    'video_id': video_id,
-                    'title': info.get('title', 'Sem título'),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'duration': duration,
-                    'duration_string': self._format_duration(duration),
-                    'uploader': info.get('uploader', info.get('channel', 'Desconhecido')),
-                    # Removido view_count para economizar tempo
-                    'qualities': qualities,
-                    'url': url
-                }
-                
-                # Armazena no cache
-                self._info_cache[video_id] = {
-                    'data': result,
-                    'timestamp': time.time()
-                }
-                
-                logger.info(f"Informações extraídas com sucesso: {result['title']}")
-                return result
+                info = self._extract_isolated(fallback_opts, url)
+                upstream_tracker.record(True)
+            
+            # Valida duração
+            duration = info.get('duration', 0)
+            validate_duration(duration, self.config.MAX_VIDEO_DURATION)
+            
+            # Qualidades padrão (não extrai de formatos para economizar tempo)
+            qualities = self._get_available_qualities(info)
+            
+            result = {
+                'video_id': video_id,
+                'title': info.get('title', 'Sem título'),
+                'thumbnail': info.get('thumbnail', ''),
+                'duration': duration,
+                'duration_string': self._format_duration(duration),
+                'uploader': info.get('uploader', info.get('channel', 'Desconhecido')),
+                # Removido view_count para economizar tempo
+                'qualities': qualities,
+                'url': url
+            }
+            
+            # Armazena no cache
+            self._info_cache[video_id] = {
+                'data': result,
+                'timestamp': time.time()
+            }
+            try:
+                cluster.put_info(video_id, result)
+            except Exception as e:
+                logger.warning(f"Erro ao salvar cache do cluster: {str(e)}")
+            
+            logger.info(f"Informações extraídas com sucesso: {result['title']}")
+            return {**result, 'start_time': start_time}
                 
         except ValidationError as e:
             logger.error(f"Erro de validação: {str(e)}")
             raise
+        except (WorkerPoolBusyError, WorkerKilledError):
+            # Falha de recurso do servidor, não do vídeo: a rota responde 503/500
+            raise
         except Exception as e:
             logger.error(f"Erro ao extrair informações: {str(e)}")
+            upstream_tracker.record_error(e)
             error_message = str(e)
 
             if "Sign in to confirm you’re not a bot" in error_message or "Sign in to confirm you're not a bot" in error_message:
@@ -171,7 +236,18 @@ class YouTubeService:
 
             raise ValidationError(f"Erro ao processar vídeo: {error_message}")
     
-    def download_video(self, url, quality='best', download_type='video'):
+    def _extract_isolated(self, ydl_opts, url):
+        """Extrai informações no pool de extração (processo isolado, com limite de memória/tempo)"""
+        output = extract_pool.run(
+            run_ydl,
+            (ydl_opts, url, False),
+            timeout=self.config.WORKER_EXTRACT_TIMEOUT,
+            wait_timeout=self.config.DOWNLOAD_QUEUE_TIMEOUT
+        )
+        return output['info']
+    
+    def download_video(self, url, quality='best', download_type='video', priority=PRIORITY_INTERACTIVE,
+                       cancel_event=None):
         """
         Faz download do vídeo ou áudio na qualidade especificada
         
@@ -179,6 +255,8 @@ class YouTubeService:
             url (str): URL do YouTube
             quality (str): Qualidade desejada
             download_type (str): Tipo de download - 'video' ou 'audio'
+            priority (str): Prioridade no agendador - 'interactive', 'prefetch' ou 'batch'
+            cancel_event (threading.Event): Cancela o download (ex: cliente desconectou)
             
         Returns:
             dict: Informações do arquivo baixado
@@ -188,91 +266,363 @@ class YouTubeService:
         """
         try:
             video_id = validate_youtube_url(url)
-            
-            # Configurar formato baseado no tipo e qualidade
-            # Opções comuns para evitar erro 403
-            common_opts = {
-                'outtmpl': str(self.download_dir / '%(id)s.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True,
-                # Headers para evitar bloqueio do YouTube
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'referer': 'https://www.youtube.com/',
-                # Opções para contornar restrições
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android', 'web'],
-                    }
-                },
-                # Otimizações de performance
-                'nocheckcertificate': True,
-                'socket_timeout': 15,
-                'http_chunk_size': 10485760,  # 10MB chunks para downloads mais rápidos
-                'retries': 3,
-                'fragment_retries': 3,
-                'concurrent_fragment_downloads': 3,  # Download paralelo de fragmentos
-                'no_playlist': True,
-            }
+            url = canonical_youtube_url(video_id)
+            # Entram no ID do job, no caminho em disco e no outtmpl do yt-dlp
+            quality, download_type = self._validate_job_params(quality, download_type)
             
             if download_type == 'audio':
                 format_string = 'bestaudio/best'
-                ydl_opts = {
-                    **common_opts,
-                    'format': format_string,
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }],
-                }
             else:
                 format_string = self._get_format_string(quality)
-                ydl_opts = {
-                    **common_opts,
-                    'format': format_string,
-                }
-
-            ydl_opts = self._apply_auth_options(ydl_opts)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logger.info(f"Iniciando download: {video_id} ({download_type}) em qualidade {quality}")
-                info = ydl.extract_info(url, download=True)
-                
-                # Encontrar o arquivo baixado
-                filename = ydl.prepare_filename(info)
-                file_path = Path(filename)
-                
-                # Para áudio, o arquivo será convertido para .mp3
-                if download_type == 'audio':
-                    file_path = file_path.with_suffix('.mp3')
-                
-                if not file_path.exists():
-                    raise ValidationError("Arquivo não foi criado após o download")
-                
-                file_size = file_path.stat().st_size
-                
-                result = {
-                    'video_id': video_id,
-                    'title': info.get('title', 'video'),
-                    'file_path': str(file_path),
-                    'file_name': file_path.name,
-                    'file_size': file_size,
-                    'file_size_mb': round(file_size / (1024 * 1024), 2),
-                    'ext': file_path.suffix,
-                    'quality': quality,
-                    'download_type': download_type
-                }
-                
-                logger.info(f"Download concluído: {result['file_name']} ({result['file_size_mb']}MB)")
-                return result
+            # Estado do job persistido para permitir retomada após crash
+            job_id = make_job_id(video_id, download_type, quality)
+            job = {
+                'job_id': job_id,
+                'url': url,
+                'video_id': video_id,
+                'quality': quality,
+                'download_type': download_type,
+                'format': format_string,
+                'output_template': str(self.download_dir / f'{job_id}.%(ext)s'),
+            }
+            
+            finished = self._claim_or_wait(job)
+            if finished:
+                return finished
+            
+            try:
+                result = self._run_download_job(job, priority, cancel_event)
+            except Exception:
+                job_store.fail(job_id)
+                raise
+            
+            self._complete_job(job_id, result)
+            return result
                 
         except ValidationError as e:
             logger.error(f"Erro de validação no download: {str(e)}")
             raise
+        except (SchedulerBusyError, WorkerKilledError):
+            raise
         except Exception as e:
             logger.error(f"Erro ao fazer download: {str(e)}")
             raise ValidationError(f"Erro no download: {str(e)}")
     
+    def job_id_for(self, url, quality='best', download_type='video'):
+        """
+        Calcula o ID do job de um download sem executá-lo
+        
+        Raises:
+            ValidationError: Se a URL for inválida
+        """
+        quality, download_type = self._validate_job_params(quality, download_type)
+        return make_job_id(validate_youtube_url(url), download_type, quality)
+    
+    def _validate_job_params(self, quality, download_type):
+        """
+        Valida qualidade e tipo vindos da requisição
+        
+        Returns:
+            tuple: (qualidade, tipo) normalizados
+            
+        Raises:
+            ValidationError: Se algum dos valores for inválido
+        """
+        return (
+            validate_quality(quality, self.config.AVAILABLE_QUALITIES),
+            validate_download_type(download_type)
+        )
+    
+    def prefetch(self, url, quality='best', download_type='video'):
+        """
+        Agenda o download em segundo plano com prioridade 'prefetch'
+        
+        Com o cluster habilitado o job vai para a fila compartilhada e pode
+        ser executado por qualquer máquina ociosa; sem cluster roda aqui.
+        
+        Returns:
+            dict: job_id e estado ('available', 'running' ou 'queued')
+        """
+        quality, download_type = self._validate_job_params(quality, download_type)
+        job_id = self.job_id_for(url, quality, download_type)
+        payload = {'url': url, 'quality': quality, 'download_type': download_type}
+        
+        if cluster.enabled:
+            node = cluster.locate(job_id)
+            if node:
+                return {'job_id': job_id, 'status': 'available', 'node_id': node['node_id']}
+            status = cluster.enqueue(job_id, payload, priority=PRIORITIES.index(PRIORITY_PREFETCH))
+            return {'job_id': job_id, 'status': status}
+        
+        def worker():
+            try:
+                self.download_video(url, quality, download_type, PRIORITY_PREFETCH)
+            except Exception as e:
+                logger.error(f"Erro no prefetch de {job_id}: {str(e)}")
+        
+        threading.Thread(target=worker, name=f'prefetch-{job_id}', daemon=True).start()
+        return {'job_id': job_id, 'status': 'queued'}
+    
+    def start_cluster_worker(self):
+        """Consome a fila compartilhada do cluster quando esta máquina está ociosa"""
+        def run_job(payload):
+            self.download_video(
+                payload['url'], payload['quality'], payload['download_type'], PRIORITY_PREFETCH
+            )
+        
+        # Ociosidade e carga vêm do job store local (comum a todos os processos),
+        # não do agendador, que só enxerga o próprio processo
+        def is_idle():
+            return job_store.count_running() == 0
+        
+        return cluster.start_worker(run_job, is_idle, job_store.count_running)
+    
+    def start_cleanup_timer(self):
+        """
+        Limpa arquivos antigos periodicamente (CLEANUP_INTERVAL)
+        
+        Independe do tráfego: uma máquina fora de rotação por disco cheio
+        não recebe requisições, mas continua liberando espaço até voltar.
+        """
+        if self._cleanup_thread is not None or self.config.CLEANUP_INTERVAL <= 0:
+            return None
+        
+        def worker():
+            while True:
+                self.cleanup_old_files(self.config.TEMP_FILE_RETENTION)
+                time.sleep(self.config.CLEANUP_INTERVAL)
+        
+        self._cleanup_thread = threading.Thread(target=worker, name='cleanup', daemon=True)
+        self._cleanup_thread.start()
+        return self._cleanup_thread
+    
+    def release_download(self, download_info):
+        """
+        Libera o arquivo de um download após o envio ao cliente
+        
+        Com cluster o arquivo fica publicado para outras requisições até a
+        limpeza periódica; sem cluster é removido junto com o job.
+        """
+        if cluster.enabled:
+            return
+        file_path = download_info['file_path']
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                logger.info(f"Arquivo removido após envio: {file_path}")
+            job_store.delete(download_info['job_id'])
+        except Exception as e:
+            logger.error(f"Erro ao remover arquivo: {str(e)}")
+    
+    def _complete_job(self, job_id, result):
+        """Marca o job como concluído e publica o arquivo no índice do cluster"""
+        job_store.complete(job_id, result['file_path'], result['title'], result['file_size'])
+        try:
+            cluster.register_artifact(job_id, result['file_size'])
+        except Exception as e:
+            logger.warning(f"Erro ao registrar arquivo no cluster: {str(e)}")
+    
+    def _claim_or_wait(self, job):
+        """
+        Assume o job ou aguarda o worker que já o executa
+        
+        Args:
+            job (dict): Job a ser executado
+            
+        Returns:
+            dict: Resultado pronto se o job já foi concluído, ou None se
+                o job foi assumido e deve ser executado por este worker
+        """
+        deadline = time.monotonic() + self.config.JOB_WAIT_TIMEOUT
+        
+        while True:
+            existing = job_store.get(job['job_id'])
+            if existing and existing['status'] == STATUS_COMPLETED:
+                file_path = Path(existing['file_path'] or '')
+                if file_path.is_file():
+                    logger.info(f"Reaproveitando download concluído: {file_path.name}")
+                    return self._build_result(existing, file_path)
+            
+            if job_store.claim(job):
+                return None
+            
+            if time.monotonic() >= deadline:
+                raise ValidationError("Download deste vídeo já está em andamento. Tente novamente em instantes.")
+            
+            logger.info(f"Aguardando job em outro worker: {job['job_id']}")
+            time.sleep(1)
+    
+    def _run_download_job(self, job, priority, cancel_event=None):
+        """
+        Executa o download de um job já assumido
+        
+        Com 'continuedl', o yt-dlp retoma os arquivos .part/fragmentos
+        deixados por uma tentativa interrompida do mesmo job.
+        
+        Args:
+            job (dict): Job assumido
+            priority (str): Prioridade no agendador
+            cancel_event (threading.Event): Cancela o download quando setado
+            
+        Returns:
+            dict: Informações do arquivo baixado
+        """
+        # Configurar formato baseado no tipo e qualidade
+        # Opções comuns para evitar erro 403
+        common_opts = {
+            'outtmpl': job['output_template'],
+            'quiet': True,
+            'no_warnings': True,
+            # Headers para evitar bloqueio do YouTube
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'referer': 'https://www.youtube.com/',
+            # Opções para contornar restrições
+            'extractor_args': {
+                'youtube': {
+                    'player_client': ['android', 'web'],
+                }
+            },
+            # Otimizações de performance
+            'nocheckcertificate': True,
+            'socket_timeout': 15,
+            'retries': 3,
+            'fragment_retries': 3,
+            'no_playlist': True,
+            # Retomar a partir de arquivos .part de tentativas anteriores
+            'continuedl': True,
+            'format': job['format'],
+        }
+        
+        if job['download_type'] == 'audio':
+            ydl_opts = {
+                **common_opts,
+                'postprocessors': [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': 'mp3',
+                    'preferredquality': '192',
+                }],
+            }
+        else:
+            ydl_opts = common_opts
+
+        ydl_opts = self._apply_auth_options(ydl_opts)
+        progress_hook = self._job_progress_hook(job['job_id'])
+        
+        # Concorrência de fragmentos, chunk e banda definidos pelo agendador global
+        with download_scheduler.acquire(priority) as lease:
+            lease_opts = lease.ydl_options()
+            hooks = lease_opts.pop('progress_hooks') + [progress_hook]
+            
+            def on_progress(status):
+                for hook in hooks:
+                    hook(status)
+            
+            logger.info(
+                f"Iniciando download: {job['video_id']} ({job['download_type']}) "
+                f"em qualidade {job['quality']}"
+            )
+            # yt-dlp e ffmpeg rodam em processo isolado; o limite de banda da
+            # vaga é repassado ao worker (on_start) e reajustado durante o download
+            try:
+                output = download_pool.run(
+                    run_ydl,
+                    ({**ydl_opts, **lease_opts}, job['url'], True),
+                    timeout=self.config.WORKER_DOWNLOAD_TIMEOUT,
+                    on_progress=on_progress,
+                    on_start=lease.bind,
+                    cancel_event=cancel_event,
+                    wait_timeout=self.config.DOWNLOAD_QUEUE_TIMEOUT
+                )
+            except (WorkerPoolBusyError, WorkerKilledError):
+                raise
+            except Exception as e:
+                upstream_tracker.record_error(e)
+                raise
+            upstream_tracker.record(True)
+        
+        info = output['info']
+        file_path = Path(output['filename'])
+        
+        # Para áudio, o arquivo será convertido para .mp3
+        if job['download_type'] == 'audio':
+            file_path = file_path.with_suffix('.mp3')
+        
+        if not file_path.exists():
+            raise ValidationError("Arquivo não foi criado após o download")
+        
+        result = self._build_result({**job, 'title': info.get('title', 'video')}, file_path)
+        logger.info(f"Download concluído: {result['file_name']} ({result['file_size_mb']}MB)")
+        return result
+    
+    def _build_result(self, job, file_path):
+        """Monta o dicionário de resultado de um job concluído"""
+        file_size = file_path.stat().st_size
+        
+        return {
+            'video_id': job['video_id'],
+            'job_id': job['job_id'],
+            'title': job.get('title') or 'video',
+            'file_path': str(file_path),
+            'file_name': file_path.name,
+            'file_size': file_size,
+            'file_size_mb': round(file_size / (1024 * 1024), 2),
+            'ext': file_path.suffix,
+            'quality': job['quality'],
+            'download_type': job['download_type']
+        }
+    
+    def _job_progress_hook(self, job_id):
+        """Cria hook que persiste os bytes baixados do job (no máximo a cada 2s)"""
+        last_update = [0.0]
+        
+        def hook(status):
+            if status.get('status') != 'downloading':
+                return
+            now = time.monotonic()
+            if now - last_update[0] < 2:
+                return
+            last_update[0] = now
+            try:
+                job_store.update_progress(
+                    job_id,
+                    status.get('downloaded_bytes') or 0,
+                    status.get('total_bytes') or status.get('total_bytes_estimate')
+                )
+            except Exception as e:
+                logger.warning(f"Falha ao salvar progresso do job {job_id}: {str(e)}")
+        
+        return hook
+    
+    def resume_interrupted_jobs(self):
+        """
+        Retoma em segundo plano os jobs interrompidos por crash ou timeout
+        
+        Os arquivos concluídos ficam em downloads/ e são entregues na próxima
+        requisição do mesmo vídeo/qualidade.
+        """
+        def worker():
+            try:
+                jobs = job_store.recover_interrupted()
+            except Exception as e:
+                logger.error(f"Erro ao recuperar jobs interrompidos: {str(e)}")
+                return
+            
+            for job in jobs:
+                if not job_store.claim(job):
+                    continue
+                logger.info(f"Retomando job interrompido: {job['job_id']} ({job['bytes_done']} bytes já baixados)")
+                try:
+                    result = self._run_download_job(job, PRIORITY_BATCH)
+                    self._complete_job(job['job_id'], result)
+                except Exception as e:
+                    job_store.fail(job['job_id'])
+                    logger.error(f"Erro ao retomar job {job['job_id']}: {str(e)}")
+        
+        thread = threading.Thread(target=worker, name='job-resume', daemon=True)
+        thread.start()
+        return thread
+    
     def _get_available_qualities(self, info):
         """
         Extrai qualidades disponíveis dos formatos (versão otimizada)
@@ -359,22 +709,33 @@ class YouTubeService:
         """
         Remove arquivos antigos do diretório de downloads
         
+        Arquivos parciais de jobs ainda vivos (em execução ou interrompidos
+        recentemente e passíveis de retomada) são preservados; só os de jobs
+        abandonados são removidos.
+        
         Args:
             max_age_seconds (int): Idade máxima dos arquivos em segundos
         """
         try:
-            import time
             current_time = time.time()
+            live_jobs = job_store.live_job_ids(max_age_seconds)
             
             for file_path in self.download_dir.iterdir():
-                if file_path.is_file() and file_path.name != '.gitkeep':
-                    file_age = current_time - file_path.stat().st_mtime
-                    if file_age > max_age_seconds:
-                        file_path.unlink()
-                        logger.info(f"Arquivo removido: {file_path.name}")
+                # Arquivos ocultos (.gitkeep, banco de jobs) não são temporários
+                if not file_path.is_file() or file_path.name.startswith('.'):
+                    continue
+                if job_id_from_filename(file_path.name) in live_jobs:
+                    continue
+                file_age = current_time - file_path.stat().st_mtime
+                if file_age > max_age_seconds:
+                    file_path.unlink()
+                    logger.info(f"Arquivo removido: {file_path.name}")
+            
+            for job_id in job_store.purge(max_age_seconds):
+                cluster.unregister_artifact(job_id)
+                logger.info(f"Job abandonado removido: {job_id}")
         except Exception as e:
             logger.error(f"Erro ao limpar arquivos antigos: {str(e)}")
 
-
 # Instância singleton do serviço
 youtube_service = YouTubeService()
@@ -1,19 +1,51 @@
 import re
-from urllib.parse import urlparse, parse_qs
 
 class ValidationError(Exception):
     """Exceção customizada para erros de validação"""
     pass
 
-def validate_youtube_url(url):
+DOWNLOAD_TYPES = ('video', 'audio')
+
+# Parser único (pré-compilado) para todas as variantes de URL do YouTube:
+# youtu.be, watch?v=, embed/, v/, e/, shorts/, live/ em www., m., music.
+# e youtube-nocookie.com
+_YOUTUBE_URL_RE = re.compile(
+    r"""
+    ^(?:https?://)?
+    (?:(?:www|m|music)\.)?
+    (?:
+        youtu\.be/(?P<short_id>[A-Za-z0-9_-]{11})
+      | youtube(?:-nocookie)?\.com/
+        (?:
+            (?:watch/?)?\?(?:[^#]*?&)?v=(?P<query_id>[A-Za-z0-9_-]{11})
+          | (?:embed|v|e|shorts|live)/(?P<path_id>[A-Za-z0-9_-]{11})
+        )
+    )
+    (?![A-Za-z0-9_-])
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+# Tempo inicial (t=, start=): 90, 90s, 1m30s, 1h2m3s
+_START_TIME_RE = re.compile(
+    r"[?&#](?:t|start|time_continue)=(?:(?P<h>\d+)h)?(?:(?P<m>\d+)m)?(?:(?P<s>\d+)s?)?(?=[&#]|$)"
+)
+
+CANONICAL_URL_TEMPLATE = 'https://www.youtube.com/watch?v={}'
+
+
+def parse_youtube_url(url):
     """
-    Valida se a URL é do YouTube e retorna o video ID
+    Interpreta uma URL do YouTube em uma única passada
+    
+    Todas as variantes de um mesmo vídeo resultam no mesmo video ID, que é a
+    chave do cache de informações e dos jobs de download.
     
     Args:
-        url (str): URL para validar
+        url (str): URL para interpretar
         
     Returns:
-        str: Video ID extraído da URL
+        tuple: (video_id, start_time) - start_time em segundos ou None
         
     Raises:
         ValidationError: Se a URL for inválida
@@ -22,33 +54,40 @@ def validate_youtube_url(url):
         raise ValidationError("URL não fornecida ou inválida")
     
     url = url.strip()
+    match = _YOUTUBE_URL_RE.match(url)
+    if not match:
+        raise ValidationError("URL do YouTube inválida")
     
-    # Padrões de URL do YouTube
-    youtube_patterns = [
-        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]{11})',
-        r'(?:https?://)?(?:www\.)?youtu\.be/([a-zA-Z0-9_-]{11})',
-        r'(?:https?://)?(?:www\.)?youtube\.com/embed/([a-zA-Z0-9_-]{11})',
-        r'(?:https?://)?(?:www\.)?youtube\.com/v/([a-zA-Z0-9_-]{11})',
-    ]
-    
-    for pattern in youtube_patterns:
-        match = re.match(pattern, url)
-        if match:
-            return match.group(1)
-    
-    # Tentar extrair de query parameters
-    try:
-        parsed_url = urlparse(url)
-        if 'youtube.com' in parsed_url.netloc or 'youtu.be' in parsed_url.netloc:
-            query_params = parse_qs(parsed_url.query)
-            if 'v' in query_params:
-                video_id = query_params['v'][0]
-                if len(video_id) == 11:
-                    return video_id
-    except Exception:
-        pass
-    
-    raise ValidationError("URL do YouTube inválida")
+    video_id = match.group('short_id') or match.group('query_id') or match.group('path_id')
+    
+    start_time = None
+    time_match = _START_TIME_RE.search(url)
+    if time_match and any(time_match.group('h', 'm', 's')):
+        hours, minutes, seconds = (int(value or 0) for value in time_match.group('h', 'm', 's'))
+        start_time = hours * 3600 + minutes * 60 + seconds
+    
+    return video_id, start_time
+
+
+def canonical_youtube_url(video_id):
+    """Retorna a URL canônica do vídeo (a única enviada ao yt-dlp)"""
+    return CANONICAL_URL_TEMPLATE.format(video_id)
+
+
+def validate_youtube_url(url):
+    """
+    Valida se a URL é do YouTube e retorna o video ID
+    
+    Args:
+        url (str): URL para validar
+        
+    Returns:
+        str: Video ID extraído da URL
+        
+    Raises:
+        ValidationError: Se a URL for inválida
+    """
+    return parse_youtube_url(url)[0]
 
 
 def validate_quality(quality, available_qualities):
@@ -68,7 +107,7 @@ def validate_quality(quality, available_qualities):
     if not quality:
         return 'best'  # default
     
-    quality = quality.strip().lower()
+    quality = str(quality).strip().lower()
     
     if quality not in [q.lower() for q in available_qualities]:
         raise ValidationError(f"Qualidade '{quality}' não disponível")
@@ -76,6 +115,30 @@ def validate_quality(quality, available_qualities):
     return quality
 
 
+def validate_download_type(download_type):
+    """
+    Valida o tipo de download
+    
+    Args:
+        download_type (str): 'video' ou 'audio'
+        
+    Returns:
+        str: Tipo validado
+        
+    Raises:
+        ValidationError: Se o tipo for inválido
+    """
+    if not download_type:
+        return 'video'  # default
+    
+    download_type = str(download_type).strip().lower()
+    
+    if download_type not in DOWNLOAD_TYPES:
+        raise ValidationError(f"Tipo de download '{download_type}' inválido")
+    
+    return download_type
+
+
 def sanitize_filename(filename):
     """
     Remove caracteres perigosos de um nome de arquivo
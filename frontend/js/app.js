@@ -185,13 +185,11 @@ function displayVideoPreview(data) {
 }
 
 function isValidYouTubeUrl(url) {
-  const patterns = [
-    /^(https?:\/\/)?(www\.)?(youtube\.com\/watch\?v=|youtu\.be\/)[a-zA-Z0-9_-]{11}/,
-    /^(https?:\/\/)?(www\.)?youtube\.com\/embed\/[a-zA-Z0-9_-]{11}/,
-    /^(https?:\/\/)?(www\.)?youtube\.com\/v\/[a-zA-Z0-9_-]{11}/,
-  ];
+  // Mesmas variantes aceitas pelo backend (utils/validators.py)
+  const pattern =
+    /^(https?:\/\/)?((www|m|music)\.)?(youtu\.be\/|youtube(-nocookie)?\.com\/((watch\/?)?\?([^#]*?&)?v=|(embed|v|e|shorts|live)\/))[a-zA-Z0-9_-]{11}(?![a-zA-Z0-9_-])/i;
 
-  return patterns.some((pattern) => pattern.test(url));
+  return pattern.test(url.trim());
 }
 
 function sanitizeFilename(filename) {
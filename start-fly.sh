@@ -27,8 +27,18 @@ mv /etc/nginx/nginx.runtime.conf /etc/nginx/nginx.conf
 # Iniciar Nginx em background
 nginx
 
-# Iniciar Flask
+# Iniciar backend
 cd /app
+if [ "${SERVER_MODE:-sync}" = "async" ]; then
+    # Modo ASGI: um worker atende muitas transferências simultâneas
+    exec python -m uvicorn \
+        --factory asgi:create_asgi_app \
+        --host 0.0.0.0 \
+        --port 5000 \
+        --workers "${ASYNC_WORKERS:-1}" \
+        --timeout-keep-alive 75
+fi
+
 python -m gunicorn \
     --bind 0.0.0.0:5000 \
     --workers "${GUNICORN_WORKERS:-2}" \